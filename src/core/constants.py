@@ -13,6 +13,7 @@ APP_WEBSITE = "https://github.com/yourusername/filesync"
 
 # Значения по умолчанию
 DEFAULT_FILE_BUFFER_SIZE = 8192  # байт
+DEFAULT_SAMPLE_WINDOW = 65536  # байт, окно выборочного хеширования
 DEFAULT_LOG_LEVEL = "info"
 DEFAULT_LOG_RETENTION_DAYS = 30
 
@@ -3,7 +3,7 @@ import json
 import sqlite3
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 class DatabaseManager:
@@ -23,6 +23,9 @@ class DatabaseManager:
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA foreign_keys = ON")
+        # В режиме WAL синхронизации NORMAL достаточно для целостности базы,
+        # fsync выполняется при checkpoint, а не на каждый COMMIT
+        conn.execute("PRAGMA synchronous = NORMAL")
         return conn
 
     @contextmanager
@@ -39,6 +42,7 @@ class DatabaseManager:
     # ------------------------------------------------------------------
     def _init_db(self) -> None:
         with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -122,6 +126,8 @@ class DatabaseManager:
                     file_path TEXT NOT NULL,
                     file_hash TEXT,
                     modified_time REAL,
+                    file_size INTEGER,
+                    inode INTEGER,
                     sync_status TEXT DEFAULT 'pending',
                     last_sync TIMESTAMP,
                     FOREIGN KEY (config_id) REFERENCES sync_configs (id) ON DELETE CASCADE,
@@ -148,6 +154,31 @@ class DatabaseManager:
                 """
             )
 
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS drive_change_states (
+                    config_id INTEGER PRIMARY KEY,
+                    account_key TEXT NOT NULL,
+                    page_token TEXT NOT NULL,
+                    loaded_at REAL NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (config_id) REFERENCES sync_configs (id) ON DELETE CASCADE
+                )
+                """
+            )
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS drive_snapshot_entries (
+                    config_id INTEGER NOT NULL,
+                    file_id TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    PRIMARY KEY (config_id, file_id),
+                    FOREIGN KEY (config_id) REFERENCES sync_configs (id) ON DELETE CASCADE
+                )
+                """
+            )
+
             self._ensure_schema(cursor)
 
     def _ensure_schema(self, cursor: sqlite3.Cursor) -> None:
@@ -185,7 +216,9 @@ class DatabaseManager:
             ("sync_history", "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
             ("sync_history", "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
             ("sync_history", "start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
-            ("sync_history", "end_time TIMESTAMP")
+            ("sync_history", "end_time TIMESTAMP"),
+            ("file_states", "file_size INTEGER"),
+            ("file_states", "inode INTEGER")
         ]
 
         for table, column_def in required_columns:
@@ -652,6 +685,24 @@ class DatabaseManager:
             )
             return cursor.lastrowid
 
+    def add_file_operations(self, operations: Iterable[Tuple[Any, ...]]) -> None:
+        """Добавить записи об операциях с файлами одной транзакцией
+
+        Каждая строка: (history_id, operation_type, file_path, source_path, target_path,
+        file_size, status, error_message).
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO sync_file_operations (
+                    history_id, operation_type, file_path, source_path, target_path,
+                    file_size, status, error_message, created_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                operations,
+            )
+
     def get_file_operations(self, history_id: int) -> List[Dict[str, Any]]:
         """Получить все операции с файлами для записи в истории"""
         with self._connection() as conn:
@@ -726,17 +777,43 @@ class DatabaseManager:
         file_hash: Optional[str] = None,
         modified_time: Optional[float] = None,
         sync_status: Optional[str] = None,
+        file_size: Optional[int] = None,
+        inode: Optional[int] = None,
     ) -> None:
         with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
                 INSERT OR REPLACE INTO file_states (
-                    config_id, file_path, file_hash, modified_time, sync_status, last_sync
+                    config_id, file_path, file_hash, modified_time, file_size, inode, sync_status, last_sync
                 )
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 """,
-                (config_id, file_path, file_hash, modified_time, sync_status),
+                (config_id, file_path, file_hash, modified_time, file_size, inode, sync_status),
+            )
+
+    def bulk_update_file_states(
+        self,
+        config_id: int,
+        rows: Iterable[Tuple[Any, ...]],
+    ) -> None:
+        """Записать состояния набора файлов одной транзакцией
+
+        Каждая строка: (file_path, file_hash, modified_time, sync_status, file_size)
+        и необязательный шестой элемент inode.
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO file_states (
+                    config_id, file_path, file_hash, modified_time, file_size, inode, sync_status, last_sync
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (
+                    (config_id, file_path, file_hash, modified_time, file_size, inode[0] if inode else None, sync_status)
+                    for file_path, file_hash, modified_time, sync_status, file_size, *inode in rows
+                ),
             )
 
     def get_file_states(self, config_id: int) -> List[Dict[str, Any]]:
@@ -746,6 +823,16 @@ class DatabaseManager:
             rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+    def get_file_state(self, config_id: int, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM file_states WHERE config_id = ? AND file_path = ?",
+                (config_id, file_path),
+            )
+            row = cursor.fetchone()
+        return dict(row) if row else None
+
     def delete_file_state(self, config_id: int, file_path: str) -> None:
         with self._connection() as conn:
             cursor = conn.cursor()
@@ -754,6 +841,76 @@ class DatabaseManager:
                 (config_id, file_path),
             )
 
+    def delete_file_states(self, config_id: int, file_paths: Iterable[str]) -> None:
+        """Удалить состояния набора файлов одной транзакцией"""
+        with self._connection() as conn:
+            conn.executemany(
+                "DELETE FROM file_states WHERE config_id = ? AND file_path = ?",
+                ((config_id, file_path) for file_path in file_paths),
+            )
+
+    # ------------------------------------------------------------------
+    # Google Drive change tracking
+    # ------------------------------------------------------------------
+    def get_drive_change_state(self, config_id: int, account_key: str) -> Optional[Dict[str, Any]]:
+        """Получить сохраненный токен Changes API и снимок диска конфигурации
+
+        Состояние, сохраненное для другой учетной записи, не возвращается.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT account_key, page_token, loaded_at FROM drive_change_states WHERE config_id = ?",
+                (config_id,),
+            )
+            row = cursor.fetchone()
+            if not row or row['account_key'] != account_key:
+                return None
+            cursor.execute(
+                "SELECT file_id, metadata FROM drive_snapshot_entries WHERE config_id = ?",
+                (config_id,),
+            )
+            entries = {entry['file_id']: self._load_json(entry['metadata'], {}) for entry in cursor.fetchall()}
+        return {
+            'page_token': row['page_token'],
+            'entries': entries,
+            'loaded': row['loaded_at'],
+        }
+
+    def save_drive_change_state(
+        self,
+        config_id: int,
+        account_key: str,
+        page_token: str,
+        loaded_at: float,
+        changed_entries: Dict[str, Any],
+        removed_ids: Iterable[str] = (),
+        replace: bool = False,
+    ) -> None:
+        """Сохранить токен Changes API и изменения снимка диска после успешной синхронизации
+
+        Записываются только измененные и удаленные файлы; при replace=True
+        (после полного чтения диска) снимок конфигурации перезаписывается целиком.
+        """
+        with self._connection() as conn:
+            if replace:
+                conn.execute("DELETE FROM drive_snapshot_entries WHERE config_id = ?", (config_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO drive_snapshot_entries (config_id, file_id, metadata) VALUES (?, ?, ?)",
+                ((config_id, file_id, json.dumps(metadata)) for file_id, metadata in changed_entries.items()),
+            )
+            conn.executemany(
+                "DELETE FROM drive_snapshot_entries WHERE config_id = ? AND file_id = ?",
+                ((config_id, file_id) for file_id in removed_ids),
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO drive_change_states (config_id, account_key, page_token, loaded_at, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (config_id, account_key, page_token, loaded_at),
+            )
+
     # ------------------------------------------------------------------
     # task management
     # ------------------------------------------------------------------
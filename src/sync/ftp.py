@@ -4,7 +4,9 @@ import hashlib
 import time
 import logging
 import shutil
-from datetime import datetime
+import socket
+import ssl
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Callable, Any, Union
 
@@ -12,6 +14,32 @@ from src.sync.utils import FileUtils, TimeUtils, CryptoUtils, NetworkUtils
 
 logger = logging.getLogger(__name__)
 
+# Размер блока при передаче файлов (по умолчанию в ftplib всего 8 КиБ)
+FTP_TRANSFER_BLOCKSIZE = 1 << 20
+# Размер буферов сокета управляющего соединения
+FTP_SOCKET_BUFFER_SIZE = 4 << 20
+# Количество команд DELE, отправляемых без ожидания ответа
+FTP_PIPELINE_DEPTH = 64
+
+# Названия месяцев в выводе LIST
+_MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+
+class _SessionReuseFTP_TLS(ftplib.FTP_TLS):
+    """FTP_TLS, который возобновляет TLS-сессию управляющего соединения на каналах данных"""
+    
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = ftplib.FTP.ntransfercmd(self, cmd, rest)
+        if self._prot_p:
+            # Без повторного использования сессии каждое соединение данных
+            # выполняет полное TLS-рукопожатие
+            conn = self.context.wrap_socket(conn, server_hostname=self.host,
+                                            session=self.sock.session)
+        return conn, size
+
+
 class FTPSyncManager:
     """Менеджер синхронизации с FTP-сервером"""
     
@@ -25,6 +53,9 @@ class FTPSyncManager:
         self.db_manager = db_manager
         self.error_handler = error_handler
         self.ftp = None
+        self._mlsd_supported = None  # None - еще не проверялось
+        self._known_local_dirs = set()  # Локальные папки, уже созданные за текущую синхронизацию
+        self._state_index: Optional[Dict[str, Dict[str, Any]]] = None  # Состояния файлов текущей синхронизации
         self.sync_stats = {
             'uploaded': 0,
             'updated': 0,
@@ -52,14 +83,18 @@ class FTPSyncManager:
             bool: True, если подключение успешно
         """
         try:
+            self._mlsd_supported = None
+            
             if use_tls:
-                self.ftp = ftplib.FTP_TLS()
+                self.ftp = _SessionReuseFTP_TLS()
                 self.ftp.connect(host, port, timeout)
+                self._tune_socket(self.ftp.sock)
                 self.ftp.login(username, password)
                 self.ftp.prot_p()  # Включаем защиту данных
             else:
                 self.ftp = ftplib.FTP()
                 self.ftp.connect(host, port, timeout)
+                self._tune_socket(self.ftp.sock)
                 self.ftp.login(username, password)
             
             logger.info(f"Подключение к FTP-серверу {host} выполнено успешно")
@@ -68,6 +103,39 @@ class FTPSyncManager:
             logger.error(f"Ошибка при подключении к FTP-серверу {host}: {e}")
             return False
     
+    @staticmethod
+    def _remote_prefix(remote_path: str) -> str:
+        """
+        Префикс для построения путей внутри папки на FTP-сервере
+        
+        Args:
+            remote_path (str): Путь к папке на FTP-сервере
+            
+        Returns:
+            str: Путь с завершающим '/', к которому достаточно дописать относительный путь
+        """
+        return remote_path.rstrip('/') + '/' if remote_path else ''
+    
+    @staticmethod
+    def _tune_socket(sock: Optional[socket.socket]):
+        """
+        Настройка сокета: отключение алгоритма Нейгла, keepalive и
+        увеличенные буферы отправки/приема
+        
+        Args:
+            sock (Optional[socket.socket]): Сокет соединения с FTP-сервером
+        """
+        if sock is None:
+            return
+        
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, FTP_SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, FTP_SOCKET_BUFFER_SIZE)
+        except OSError as e:
+            logger.debug(f"Не удалось изменить параметры сокета: {e}")
+    
     def disconnect(self):
         """Отключение от FTP-сервера"""
         if self.ftp:
@@ -146,7 +214,8 @@ class FTPSyncManager:
                 callback(f"Ошибка: {error_msg}", "error")
             return self.sync_stats
         
-        # Сброс статистики
+        # Сброс статистики и кеша созданных папок
+        self._known_local_dirs = set()
         self.sync_stats = {
             'uploaded': 0,
             'updated': 0,
@@ -181,6 +250,8 @@ class FTPSyncManager:
             return self.sync_stats
         
         try:
+            self._state_index = self._load_state_index(config_id)
+            
             if direction == 'upload':
                 # Синхронизация из локальной папки на FTP-сервер
                 self._sync_upload(config_id, source_path, target_path, callback, delete_mode)
@@ -243,6 +314,9 @@ class FTPSyncManager:
                 )
             
             return self.sync_stats
+        
+        finally:
+            self._state_index = None
     
     def _sync_upload(self, config_id: int, source_path: str, target_path: str, 
                     callback: Optional[Callable[[str, str], None]] = None, 
@@ -268,6 +342,8 @@ class FTPSyncManager:
         
         # Получаем список файлов на FTP-сервере
         ftp_files = self._get_ftp_files(target_path)
+        ftp_by_path = {file_info['path']: file_info for file_info in ftp_files}
+        target_prefix = self._remote_prefix(target_path)
         
         # Синхронизируем файлы из локальной папки на FTP-сервер
         for root, dirs, files in os.walk(source_path):
@@ -283,7 +359,7 @@ class FTPSyncManager:
                 rel_path = os.path.relpath(local_file_path, source_path)
                 
                 # Определяем путь на FTP-сервере
-                ftp_path = os.path.join(target_path, rel_path).replace("\\", "/")
+                ftp_path = target_prefix + rel_path.replace(os.sep, "/")
                 ftp_dir = os.path.dirname(ftp_path)
                 ftp_filename = os.path.basename(ftp_path)
                 
@@ -297,20 +373,11 @@ class FTPSyncManager:
                     continue
                 
                 # Проверяем, существует ли файл на FTP-сервере
-                file_exists = False
-                file_mtime = None
-                file_size = None
+                file_info = ftp_by_path.get(ftp_path)
                 
-                for file_info in ftp_files:
-                    if file_info['path'] == ftp_path:
-                        file_exists = True
-                        file_mtime = file_info['mtime']
-                        file_size = file_info['size']
-                        break
-                
-                if file_exists:
+                if file_info is not None:
                     # Файл существует на FTP-сервере, проверяем, нужно ли обновлять
-                    if self._need_upload(local_file_path, file_mtime, file_size, config_id, rel_path):
+                    if self._need_upload(local_file_path, file_info['mtime'], file_info['size'], config_id, rel_path):
                         if self._upload_file(local_file_path, ftp_path, callback):
                             self.sync_stats['updated'] += 1
                             
@@ -334,11 +401,10 @@ class FTPSyncManager:
         # ВАЖНО: удаляем только те файлы, которые система сама синхронизировала (есть в file_states)
         if delete_mode:
             # Получаем список файлов, которые были синхронизированы системой
-            synced_files = set()
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                synced_files.add(state['file_path'])
+            synced_files = set(self._state_index) if self._state_index is not None else {
+                state['file_path'] for state in self.db_manager.get_file_states(config_id)}
 
+            to_delete = {}
             for file_info in ftp_files:
                 ftp_path = file_info['path']
                 rel_path = os.path.relpath(ftp_path, target_path).replace("\\", "/")
@@ -347,16 +413,18 @@ class FTPSyncManager:
                 if not os.path.exists(local_file_path):
                     # Удаляем только если этот файл был синхронизирован системой
                     if rel_path in synced_files:
-                        if self._delete_file(ftp_path, callback):
-                            self.sync_stats['deleted'] += 1
-
-                            # Удаляем состояние файла из базы данных
-                            self.db_manager.delete_file_state(config_id, rel_path)
+                        to_delete[ftp_path] = rel_path
                     else:
                         # Файл не был синхронизирован системой, пропускаем
                         logger.debug(f"Пропущен файл {rel_path} - не был синхронизирован этой системой")
                         if callback:
                             callback(f"Пропущен файл (не синхронизирован системой): {rel_path}", "debug")
+
+            for ftp_path in self._delete_files_pipelined(list(to_delete), callback):
+                self.sync_stats['deleted'] += 1
+
+                # Удаляем состояние файла из базы данных
+                self.db_manager.delete_file_state(config_id, to_delete[ftp_path])
     
     def _sync_download(self, config_id: int, target_path: str, source_path: str, 
                       callback: Optional[Callable[[str, str], None]] = None, 
@@ -389,6 +457,7 @@ class FTPSyncManager:
         
         # Получаем список файлов на FTP-сервере
         ftp_files = self._get_ftp_files(source_path)
+        ftp_paths = {file_info['path'] for file_info in ftp_files}
         
         # Получаем список локальных файлов
         local_files = self._get_local_files(target_path)
@@ -401,10 +470,10 @@ class FTPSyncManager:
             
             # Создаем подкаталоги, если необходимо
             target_dir = os.path.dirname(local_file_path)
-            if not os.path.exists(target_dir):
+            if target_dir not in self._known_local_dirs:
                 try:
-                    os.makedirs(target_dir)
-                    logger.debug(f"Создан подкаталог: {target_dir}")
+                    os.makedirs(target_dir, exist_ok=True)
+                    self._known_local_dirs.add(target_dir)
                 except Exception as e:
                     error_msg = f"Ошибка при создании подкаталога {target_dir}: {e}"
                     logger.error(error_msg)
@@ -416,15 +485,15 @@ class FTPSyncManager:
             # Проверяем, существует ли файл локально
             if rel_path not in local_files:
                 # Файла нет локально, скачиваем
-                if self._download_file(ftp_path, local_file_path, callback):
+                if self._download_file(ftp_path, local_file_path, callback, file_info['size']):
                     self.sync_stats['downloaded'] += 1
                     
                     # Обновляем состояние файла в базе данных
                     self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
             else:
                 # Файл есть локально, проверяем, нужно ли обновлять
-                if self._need_download(ftp_path, local_file_path, config_id, rel_path):
-                    if self._download_file(ftp_path, local_file_path, callback):
+                if self._need_download(local_file_path, file_info['mtime'], file_info['size'], config_id, rel_path):
+                    if self._download_file(ftp_path, local_file_path, callback, file_info['size']):
                         self.sync_stats['downloaded'] += 1
                         
                         # Обновляем состояние файла в базе данных
@@ -440,22 +509,15 @@ class FTPSyncManager:
         # ВАЖНО: удаляем только те файлы, которые система сама синхронизировала (есть в file_states)
         if delete_mode:
             # Получаем список файлов, которые были синхронизированы системой
-            synced_files = set()
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                synced_files.add(state['file_path'])
+            synced_files = set(self._state_index) if self._state_index is not None else {
+                state['file_path'] for state in self.db_manager.get_file_states(config_id)}
 
+            source_prefix = self._remote_prefix(source_path)
             for rel_path in local_files:
-                ftp_path = os.path.join(source_path, rel_path).replace("\\", "/")
+                ftp_path = source_prefix + rel_path.replace(os.sep, "/")
 
                 # Проверяем, существует ли файл на FTP-сервере
-                file_exists = False
-                for file_info in ftp_files:
-                    if file_info['path'] == ftp_path:
-                        file_exists = True
-                        break
-
-                if not file_exists:
+                if ftp_path not in ftp_paths:
                     # Удаляем только если этот файл был синхронизирован системой
                     if rel_path in synced_files:
                         local_file_path = os.path.join(target_path, rel_path)
@@ -483,104 +545,199 @@ class FTPSyncManager:
         files = []
         
         try:
-            # Сохраняем текущую директорию
-            original_dir = self.ftp.pwd()
-            
-            # Переходим в указанную директорию
-            self.ftp.cwd(remote_path)
-            
-            # Получаем список файлов и директорий
-            items = []
-            self.ftp.retrlines('LIST', items.append)
-            
-            for item in items:
-                # Парсим строку LIST
-                parts = item.split()
-                if len(parts) < 9:
-                    continue
-                
-                # Определяем тип (файл или директория)
-                item_type = parts[0][0]
-                item_name = ' '.join(parts[8:])
-                
-                # Пропускаем специальные директории
-                if item_name in ['.', '..']:
-                    continue
-                
-                # Формируем полный путь
-                item_path = f"{remote_path}/{item_name}" if remote_path != '/' else f"/{item_name}"
-                
-                if item_type == 'd':  # Директория
+            for entry in self._list_directory(remote_path):
+                if entry['type'] == 'dir':
                     # Рекурсивно получаем содержимое директории
-                    sub_files = self._get_ftp_files(item_path)
-                    files.extend(sub_files)
-                else:  # Файл
-                    # Получаем размер файла
-                    try:
-                        size = int(parts[4])
-                    except (ValueError, IndexError):
-                        size = 0
-                    
-                    # Получаем время модификации
-                    try:
-                        # Формат времени может отличаться в зависимости от FTP-сервера
-                        # Это упрощенный парсинг, который может потребовать доработок
-                        month_str = parts[5]
-                        day = parts[6]
-                        year_or_time = parts[7]
-                        
-                        # Определяем, это год или время
-                        if ':' in year_or_time:
-                            # Это время, значит год - текущий
-                            time_parts = year_or_time.split(':')
-                            hour = int(time_parts[0])
-                            minute = int(time_parts[1])
-                            
-                            # Преобразуем месяц в число
-                            month_map = {
-                                'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                                'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-                            }
-                            month = month_map.get(month_str, 1)
-                            
-                            # Создаем объект datetime
-                            now = datetime.now()
-                            year = now.year
-                            
-                            mtime = datetime(year, month, int(day), hour, minute).timestamp()
-                        else:
-                            # Это год
-                            year = int(year_or_time)
-                            
-                            # Преобразуем месяц в число
-                            month_map = {
-                                'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                                'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-                            }
-                            month = month_map.get(month_str, 1)
-                            
-                            # Создаем объект datetime
-                            mtime = datetime(year, month, int(day)).timestamp()
-                    except Exception as e:
-                        logger.error(f"Ошибка при парсинге времени файла {item_name}: {e}")
-                        mtime = 0
-                    
+                    files.extend(self._get_ftp_files(entry['path']))
+                else:
                     files.append({
-                        'path': item_path,
-                        'name': item_name,
-                        'size': size,
-                        'mtime': mtime
+                        'path': entry['path'],
+                        'name': entry['name'],
+                        'size': entry['size'],
+                        'mtime': entry['mtime']
                     })
             
-            # Возвращаемся в исходную директорию
-            self.ftp.cwd(original_dir)
-            
             return files
             
         except Exception as e:
             logger.error(f"Ошибка при получении списка файлов с FTP-сервера: {e}")
             return []
     
+    def _list_directory(self, remote_path: str) -> List[Dict[str, Any]]:
+        """
+        Получение содержимого одной директории на FTP-сервере
+        
+        Используется MLSD; если сервер его не поддерживает, выполняется
+        разбор вывода LIST.
+        
+        Args:
+            remote_path (str): Путь к папке на FTP-сервере
+            
+        Returns:
+            List[Dict[str, Any]]: Записи с ключами name, path, type ('file' или 'dir'), size и mtime
+        """
+        if self._mlsd_supported is not False:
+            try:
+                entries = self._list_directory_mlsd(remote_path)
+                self._mlsd_supported = True
+                return entries
+            except ftplib.error_perm as e:
+                if self._mlsd_supported:
+                    # MLSD работает, значит ошибка относится к самой директории
+                    raise
+                logger.debug(f"Сервер не поддерживает MLSD ({e}), используется LIST")
+                self._mlsd_supported = False
+        
+        return self._list_directory_list(remote_path)
+    
+    @staticmethod
+    def _parse_mlsx_time(modify: str) -> float:
+        """
+        Разбор значения факта modify из ответа MLSD
+        
+        Args:
+            modify (str): Время в формате YYYYMMDDHHMMSS[.sss] (всегда UTC)
+            
+        Returns:
+            float: Время в формате timestamp
+        """
+        return datetime.strptime(modify[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc).timestamp()
+    
+    def _list_directory_mlsd(self, remote_path: str) -> List[Dict[str, Any]]:
+        """
+        Получение содержимого директории командой MLSD
+        
+        Args:
+            remote_path (str): Путь к папке на FTP-сервере
+            
+        Returns:
+            List[Dict[str, Any]]: Записи о файлах и директориях
+        """
+        entries = []
+        
+        for item_name, facts in self.ftp.mlsd(remote_path, facts=['type', 'size', 'modify']):
+            item_type = facts.get('type', '').lower()
+            if item_type not in ('file', 'dir') or item_name in ('.', '..'):
+                continue
+            
+            item_path = f"{remote_path}/{item_name}" if remote_path != '/' else f"/{item_name}"
+            
+            try:
+                size = int(facts.get('size', 0))
+            except ValueError:
+                size = 0
+            
+            try:
+                mtime = self._parse_mlsx_time(facts.get('modify'))
+            except (TypeError, ValueError) as e:
+                if item_type == 'file':
+                    logger.error(f"Ошибка при парсинге времени файла {item_name}: {e}")
+                mtime = 0
+            
+            entries.append({
+                'name': item_name,
+                'path': item_path,
+                'type': item_type,
+                'size': size,
+                'mtime': mtime
+            })
+        
+        return entries
+    
+    def _list_directory_list(self, remote_path: str) -> List[Dict[str, Any]]:
+        """
+        Получение содержимого директории разбором вывода LIST
+        
+        Args:
+            remote_path (str): Путь к папке на FTP-сервере
+            
+        Returns:
+            List[Dict[str, Any]]: Записи о файлах и директориях
+        """
+        entries = []
+        
+        # Сохраняем текущую директорию
+        original_dir = self.ftp.pwd()
+        
+        # Переходим в указанную директорию
+        self.ftp.cwd(remote_path)
+        
+        # Получаем список файлов и директорий
+        items = []
+        self.ftp.retrlines('LIST', items.append)
+        
+        # Возвращаемся в исходную директорию
+        self.ftp.cwd(original_dir)
+        
+        # Если вместо года указано время, значит год - текущий
+        current_year = datetime.now().year
+        
+        for item in items:
+            # Парсим строку LIST
+            parts = item.split()
+            if len(parts) < 9:
+                continue
+            
+            # Определяем тип (файл или директория)
+            item_type = parts[0][0]
+            item_name = ' '.join(parts[8:])
+            
+            # Пропускаем специальные директории
+            if item_name in ['.', '..']:
+                continue
+            
+            # Формируем полный путь
+            item_path = f"{remote_path}/{item_name}" if remote_path != '/' else f"/{item_name}"
+            
+            if item_type == 'd':  # Директория
+                entries.append({
+                    'name': item_name,
+                    'path': item_path,
+                    'type': 'dir',
+                    'size': 0,
+                    'mtime': 0
+                })
+                continue
+            
+            # Получаем размер файла
+            try:
+                size = int(parts[4])
+            except (ValueError, IndexError):
+                size = 0
+            
+            # Получаем время модификации
+            try:
+                # Формат времени может отличаться в зависимости от FTP-сервера
+                # Это упрощенный парсинг, который может потребовать доработок
+                month_str = parts[5]
+                day = parts[6]
+                year_or_time = parts[7]
+                
+                # Преобразуем месяц в число
+                month = _MONTHS.get(month_str, 1)
+                
+                # Определяем, это год или время
+                if ':' in year_or_time:
+                    # Это время, значит год - текущий
+                    hour, minute = year_or_time.split(':')
+                    mtime = datetime(current_year, month, int(day), int(hour), int(minute)).timestamp()
+                else:
+                    # Это год
+                    mtime = datetime(int(year_or_time), month, int(day)).timestamp()
+            except Exception as e:
+                logger.error(f"Ошибка при парсинге времени файла {item_name}: {e}")
+                mtime = 0
+            
+            entries.append({
+                'name': item_name,
+                'path': item_path,
+                'type': 'file',
+                'size': size,
+                'mtime': mtime
+            })
+        
+        return entries
+    
     def _get_local_files(self, folder_path: str) -> Dict[str, Dict[str, Any]]:
         """
         Получение списка всех файлов в локальной папке и подпапках
@@ -617,6 +774,71 @@ class FTPSyncManager:
         
         return files
     
+    def _scan_local_files(self, folder_path: str):
+        """
+        Рекурсивный обход локальной папки через os.scandir
+        
+        Данные stat берутся из DirEntry, поэтому повторный os.stat для каждого
+        файла не нужен.
+        
+        Args:
+            folder_path (str): Путь к папке
+            
+        Yields:
+            Tuple[str, str, os.stat_result]: Полный путь, относительный путь и stat файла
+        """
+        prefix_len = len(os.path.join(folder_path, ''))
+        pending_dirs = [folder_path]
+        
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        # Пропускаем скрытые файлы и папки
+                        if entry.name.startswith('.'):
+                            continue
+                        
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                            elif entry.is_file():
+                                yield entry.path, entry.path[prefix_len:], entry.stat()
+                        except OSError as e:
+                            logger.error(f"Ошибка при получении информации о файле {entry.path}: {e}")
+            except OSError as e:
+                logger.error(f"Ошибка при чтении папки {current_dir}: {e}")
+    
+    def _load_state_index(self, config_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузка состояний файлов конфигурации одним запросом
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Состояния файлов по относительному пути
+        """
+        return {state['file_path']: state for state in self.db_manager.get_file_states(config_id)}
+    
+    def _get_file_state(self, config_id: int, rel_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Получение сохраненного состояния файла
+        
+        Во время синхронизации и предпросмотра используется индекс из _load_state_index,
+        иначе выполняется запрос к базе данных.
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            rel_path (str): Относительный путь к файлу
+            
+        Returns:
+            Optional[Dict[str, Any]]: Состояние файла или None
+        """
+        if self._state_index is not None:
+            return self._state_index.get(rel_path)
+        return self.db_manager.get_file_state(config_id, rel_path)
+    
     def _need_upload(self, local_file_path: str, remote_mtime: Optional[float], 
                     remote_size: Optional[int], config_id: int, rel_path: str) -> bool:
         """
@@ -633,46 +855,114 @@ class FTPSyncManager:
             bool: True, если файл нужно загрузить/обновить
         """
         try:
-            # Получаем информацию о локальном файле
-            local_stat = os.stat(local_file_path)
-            local_size = local_stat.st_size
-            local_mtime = local_stat.st_mtime
-            
             # Если удаленный файл не существует, загружаем
             if remote_mtime is None or remote_size is None:
                 return True
             
-            # Сравниваем размеры
-            if local_size != remote_size:
-                return True
-            
-            # Сравниваем время модификации
-            if local_mtime > remote_mtime:
-                return True
-            
-            # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            # Получаем информацию о локальном файле
+            local_stat = os.stat(local_file_path)
+            local_size = local_stat.st_size
+            local_mtime = local_stat.st_mtime
             
-            return False
+            state = self._get_file_state(config_id, rel_path)
+            return self._upload_required(local_size, local_mtime, remote_size, remote_mtime, state)
             
         except Exception as e:
             logger.error(f"Ошибка при проверке необходимости загрузки файла {local_file_path}: {e}")
             return True  # В случае ошибки, считаем что файл нужно обновить
     
-    def _need_download(self, remote_path: str, local_file_path: str, 
-                      config_id: int, rel_path: str) -> bool:
+    @staticmethod
+    def _upload_required(local_size: int, local_mtime: float, remote_size: int, remote_mtime: float,
+                         state: Optional[Dict[str, Any]]) -> bool:
+        """
+        Сравнение локального и удаленного файла с учетом состояния в базе данных
+        
+        Args:
+            local_size (int): Размер локального файла
+            local_mtime (float): Время модификации локального файла
+            remote_size (int): Размер файла на FTP-сервере
+            remote_mtime (float): Время модификации файла на FTP-сервере
+            state (Optional[Dict[str, Any]]): Состояние файла в базе данных
+            
+        Returns:
+            bool: True, если файл нужно обновить
+        """
+        # Сначала проверяем состояние файла в базе данных: если локальный файл
+        # не менялся с последней синхронизации и размер на сервере совпадает,
+        # остальные проверки не нужны
+        state_mtime = state.get('modified_time') if state else None
+        if state_mtime is not None and state.get('file_size') == local_size == remote_size \
+                and abs(state_mtime - local_mtime) <= 1:  # Допускаем погрешность в 1 секунду
+            return False
+        
+        # Сравниваем размеры
+        if local_size != remote_size:
+            return True
+        
+        # Сравниваем время модификации
+        if local_mtime > remote_mtime:
+            return True
+        
+        # Если время модификации в базе отличается от текущего, нужно обновить
+        if state_mtime is not None and abs(state_mtime - local_mtime) > 1:
+            return True
+        
+        return False
+    
+    def _classify_upload_batch(self, local_files: Dict[str, Dict[str, Any]],
+                               ftp_by_path: Dict[str, Dict[str, Any]], config_id: int,
+                               target_path: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Классификация всех локальных файлов для загрузки за один проход
+        
+        Args:
+            local_files (Dict[str, Dict[str, Any]]): Локальные файлы из _get_local_files
+            ftp_by_path (Dict[str, Dict[str, Any]]): Файлы на FTP-сервере по полному пути
+            config_id (int): ID конфигурации в базе данных
+            target_path (str): Путь к папке на FTP-сервере
+            
+        Returns:
+            Tuple[List, List, List]: Файлы для загрузки, для обновления и пропускаемые
+        """
+        to_upload, to_update, to_skip = [], [], []
+        file_states_by_path = self._state_index
+        if file_states_by_path is None:
+            file_states_by_path = self._load_state_index(config_id)
+        target_prefix = self._remote_prefix(target_path)
+        
+        for rel_path, file_info in local_files.items():
+            entry = {
+                'path': rel_path,
+                'size': file_info['size'],
+                'mtime': file_info['mtime']
+            }
+            
+            ftp_path = target_prefix + rel_path.replace(os.sep, "/")
+            ftp_file = ftp_by_path.get(ftp_path)
+            
+            if ftp_file is None:
+                # Файла нет на FTP-сервере, загружаем
+                to_upload.append(entry)
+            elif self._upload_required(file_info['size'], file_info['mtime'], ftp_file['size'],
+                                       ftp_file['mtime'], file_states_by_path.get(rel_path)):
+                to_update.append(entry)
+            else:
+                to_skip.append(entry)
+        
+        return to_upload, to_update, to_skip
+    
+    def _need_download(self, local_file_path: str, remote_mtime: float, 
+                      remote_size: int, config_id: int, rel_path: str) -> bool:
         """
         Проверка, нужно ли скачивать/обновлять файл
         
+        Размер и время модификации берутся из листинга _get_ftp_files,
+        отдельный запрос к серверу для каждого файла не выполняется.
+        
         Args:
-            remote_path (str): Путь к файлу на FTP-сервере
             local_file_path (str): Путь к локальному файлу
+            remote_mtime (float): Время модификации файла на FTP-сервере
+            remote_size (int): Размер файла на FTP-сервере
             config_id (int): ID конфигурации в базе данных
             rel_path (str): Относительный путь к файлу
             
@@ -685,89 +975,6 @@ class FTPSyncManager:
             local_size = local_stat.st_size
             local_mtime = local_stat.st_mtime
             
-            # Получаем информацию о файле на FTP-сервере
-            remote_dir = os.path.dirname(remote_path)
-            remote_filename = os.path.basename(remote_path)
-            
-            # Сохраняем текущую директорию
-            original_dir = self.ftp.pwd()
-            
-            # Переходим в директорию файла
-            self.ftp.cwd(remote_dir)
-            
-            # Получаем список файлов
-            items = []
-            self.ftp.retrlines('LIST', items.append)
-            
-            # Ищем нужный файл
-            remote_mtime = None
-            remote_size = None
-            
-            for item in items:
-                parts = item.split()
-                if len(parts) < 9:
-                    continue
-                
-                item_name = ' '.join(parts[8:])
-                
-                if item_name == remote_filename:
-                    # Получаем размер файла
-                    try:
-                        remote_size = int(parts[4])
-                    except (ValueError, IndexError):
-                        remote_size = 0
-                    
-                    # Получаем время модификации
-                    try:
-                        month_str = parts[5]
-                        day = parts[6]
-                        year_or_time = parts[7]
-                        
-                        # Определяем, это год или время
-                        if ':' in year_or_time:
-                            # Это время, значит год - текущий
-                            time_parts = year_or_time.split(':')
-                            hour = int(time_parts[0])
-                            minute = int(time_parts[1])
-                            
-                            # Преобразуем месяц в число
-                            month_map = {
-                                'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                                'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-                            }
-                            month = month_map.get(month_str, 1)
-                            
-                            # Создаем объект datetime
-                            now = datetime.now()
-                            year = now.year
-                            
-                            remote_mtime = datetime(year, month, int(day), hour, minute).timestamp()
-                        else:
-                            # Это год
-                            year = int(year_or_time)
-                            
-                            # Преобразуем месяц в число
-                            month_map = {
-                                'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                                'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-                            }
-                            month = month_map.get(month_str, 1)
-                            
-                            # Создаем объект datetime
-                            remote_mtime = datetime(year, month, int(day)).timestamp()
-                    except Exception as e:
-                        logger.error(f"Ошибка при парсинге времени файла {item_name}: {e}")
-                        remote_mtime = 0
-                    
-                    break
-            
-            # Возвращаемся в исходную директорию
-            self.ftp.cwd(original_dir)
-            
-            # Если файл не найден на сервере, пропускаем
-            if remote_mtime is None or remote_size is None:
-                return False
-            
             # Сравниваем размеры
             if local_size != remote_size:
                 return True
@@ -777,13 +984,10 @@ class FTPSyncManager:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            state = self._get_file_state(config_id, rel_path)
+            # Если время модификации в базе отличается от текущего, нужно обновить
+            if state and abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
+                return True
             
             return False
             
@@ -791,6 +995,57 @@ class FTPSyncManager:
             logger.error(f"Ошибка при проверке необходимости скачивания файла {local_file_path}: {e}")
             return True  # В случае ошибки, считаем что файл нужно обновить
     
+    def _retrieve_binary(self, cmd: str, f) -> None:
+        """
+        Скачивание данных через отдельное соединение в открытый файл
+        
+        В отличие от retrbinary данные копируются крупными блоками без
+        вызова Python-функции на каждый принятый пакет.
+        
+        Args:
+            cmd (str): Команда FTP (например, RETR <имя файла>)
+            f: Файл, открытый на запись в двоичном режиме
+        """
+        self.ftp.voidcmd('TYPE I')
+        with self.ftp.transfercmd(cmd) as conn:
+            self._tune_socket(conn)
+            with conn.makefile('rb', buffering=FTP_TRANSFER_BLOCKSIZE) as stream:
+                shutil.copyfileobj(stream, f, FTP_TRANSFER_BLOCKSIZE)
+            # Корректно завершаем TLS-сессию канала данных
+            if isinstance(conn, ssl.SSLSocket):
+                conn.unwrap()
+        self.ftp.voidresp()
+    
+    def _store_binary(self, cmd: str, f) -> None:
+        """
+        Загрузка открытого файла через отдельное соединение
+        
+        Для обычного TCP-соединения файл передается в сокет средствами ядра
+        (socket.sendfile использует os.sendfile, если он доступен). Для TLS
+        данные нужно шифровать в пространстве пользователя, поэтому файл
+        читается в один переиспользуемый буфер.
+        
+        Args:
+            cmd (str): Команда FTP (например, STOR <имя файла>)
+            f: Файл, открытый на чтение в двоичном режиме
+        """
+        self.ftp.voidcmd('TYPE I')
+        with self.ftp.transfercmd(cmd) as conn:
+            self._tune_socket(conn)
+            if isinstance(conn, ssl.SSLSocket):
+                buffer = bytearray(FTP_TRANSFER_BLOCKSIZE)
+                view = memoryview(buffer)
+                while True:
+                    read_size = f.readinto(buffer)
+                    if not read_size:
+                        break
+                    conn.sendall(view[:read_size])
+                # Корректно завершаем TLS-сессию канала данных
+                conn.unwrap()
+            else:
+                conn.sendfile(f)
+        self.ftp.voidresp()
+    
     def _upload_file(self, local_file_path: str, remote_path: str, 
                     callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
@@ -817,7 +1072,7 @@ class FTPSyncManager:
                 self.ftp.cwd(remote_dir)
                 
                 # Загружаем файл
-                self.ftp.storbinary(f'STOR {remote_filename}', f)
+                self._store_binary(f'STOR {remote_filename}', f)
                 
                 # Возвращаемся в исходную директорию
                 self.ftp.cwd(original_dir)
@@ -839,7 +1094,8 @@ class FTPSyncManager:
             return False
     
     def _download_file(self, remote_path: str, local_file_path: str, 
-                      callback: Optional[Callable[[str, str], None]] = None) -> bool:
+                      callback: Optional[Callable[[str, str], None]] = None,
+                      remote_size: Optional[int] = None) -> bool:
         """
         Скачивание файла с FTP-сервера
         
@@ -847,6 +1103,7 @@ class FTPSyncManager:
             remote_path (str): Путь к файлу на FTP-сервере
             local_file_path (str): Путь для сохранения файла
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            remote_size (Optional[int]): Размер файла на FTP-сервере, если известен
             
         Returns:
             bool: True, если скачивание успешно
@@ -864,12 +1121,22 @@ class FTPSyncManager:
             
             # Создаем директорию для сохранения файла, если она не существует
             output_dir = os.path.dirname(local_file_path)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+            if output_dir not in self._known_local_dirs:
+                os.makedirs(output_dir, exist_ok=True)
+                self._known_local_dirs.add(output_dir)
             
             # Скачиваем файл
             with open(local_file_path, 'wb') as f:
-                self.ftp.retrbinary(f'RETR {remote_filename}', f.write)
+                # Резервируем место под файл заранее, чтобы избежать фрагментации
+                if remote_size and hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, remote_size)
+                    except OSError as e:
+                        logger.debug(f"Не удалось зарезервировать место для {local_file_path}: {e}")
+                
+                self._retrieve_binary(f'RETR {remote_filename}', f)
+                # Обрезаем файл, если фактический размер меньше зарезервированного
+                f.truncate()
             
             # Возвращаемся в исходную директорию
             self.ftp.cwd(original_dir)
@@ -934,6 +1201,66 @@ class FTPSyncManager:
             self.sync_stats['errors'] += 1
             return False
     
+    def _delete_files_pipelined(self, remote_paths: List[str],
+                                callback: Optional[Callable[[str, str], None]] = None) -> List[str]:
+        """
+        Пакетное удаление файлов с FTP-сервера
+        
+        Команды DELE отправляются пачками по FTP_PIPELINE_DEPTH штук без ожидания
+        ответа на каждую, ответы читаются после отправки всей пачки. Так на
+        удаление пачки уходит одна задержка сети вместо одной на каждый файл.
+        
+        Args:
+            remote_paths (List[str]): Пути к файлам на FTP-сервере
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            
+        Returns:
+            List[str]: Пути успешно удаленных файлов
+        """
+        deleted = []
+        
+        for start in range(0, len(remote_paths), FTP_PIPELINE_DEPTH):
+            batch = remote_paths[start:start + FTP_PIPELINE_DEPTH]
+            
+            try:
+                if any('\r' in path or '\n' in path for path in batch):
+                    raise ValueError("путь содержит символ перевода строки")
+                
+                commands = ''.join(f"DELE {path}\r\n" for path in batch)
+                self.ftp.sock.sendall(commands.encode(self.ftp.encoding))
+            except Exception as e:
+                # Пачка не отправлена, удаляем эти файлы по одному
+                logger.debug(f"Не удалось отправить пакет команд DELE: {e}")
+                deleted.extend(path for path in batch if self._delete_file(path, callback))
+                continue
+            
+            for index, path in enumerate(batch):
+                try:
+                    self.ftp.getresp()
+                except ftplib.Error as e:
+                    error_msg = f"Ошибка при удалении файла {path} с FTP-сервера: {e}"
+                    logger.error(error_msg)
+                    if callback:
+                        callback(error_msg, "error")
+                    self.sync_stats['errors'] += 1
+                    continue
+                except Exception as e:
+                    # Управляющее соединение нарушено, остальные ответы не прочитать
+                    error_msg = f"Ошибка при пакетном удалении файлов с FTP-сервера: {e}"
+                    logger.error(error_msg)
+                    if callback:
+                        callback(error_msg, "error")
+                    self.sync_stats['errors'] += len(remote_paths) - start - index
+                    return deleted
+                
+                deleted.append(path)
+                info_msg = f"Удален файл с FTP-сервера: {os.path.basename(path)}"
+                logger.info(info_msg)
+                if callback:
+                    callback(info_msg, "info")
+        
+        return deleted
+    
     def _delete_local_file(self, file_path: str, callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
         Удаление локального файла
@@ -969,7 +1296,8 @@ class FTPSyncManager:
             self.sync_stats['errors'] += 1
             return False
     
-    def _update_file_state_in_db(self, config_id: int, rel_path: str, file_path: str, sync_status: str):
+    def _update_file_state_in_db(self, config_id: int, rel_path: str, file_path: str, sync_status: str,
+                                 file_stat: Optional[os.stat_result] = None):
         """
         Обновление состояния файла в базе данных
         
@@ -978,16 +1306,19 @@ class FTPSyncManager:
             rel_path (str): Относительный путь к файлу
             file_path (str): Полный путь к файлу
             sync_status (str): Статус синхронизации
+            file_stat (Optional[os.stat_result]): Уже полученный stat файла (без повторного вызова)
         """
         try:
-            file_stat = os.stat(file_path)
+            if file_stat is None:
+                file_stat = os.stat(file_path)
             
             self.db_manager.update_file_state(
                 config_id=config_id,
                 file_path=rel_path,
                 file_hash=None,  # Для FTP не используем хеш
                 modified_time=file_stat.st_mtime,
-                sync_status=sync_status
+                sync_status=sync_status,
+                file_size=file_stat.st_size
             )
         except Exception as e:
             logger.error(f"Ошибка при обновлении состояния файла в базе данных: {e}")
@@ -1004,47 +1335,35 @@ class FTPSyncManager:
         """
         try:
             if direction == 'upload':
-                # Обновляем состояния на основе локальных файлов
-                for root, dirs, files in os.walk(source_path):
-                    for filename in files:
-                        local_file_path = os.path.join(root, filename)
-                        rel_path = os.path.relpath(local_file_path, source_path)
-                        
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                
-                # Удаляем из базы данных записи о файлах, которых больше нет локально
-                file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    local_file_path = os.path.join(source_path, state['file_path'])
-                    if not os.path.exists(local_file_path):
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+                # Обновляем состояния на основе локальных файлов одной транзакцией
+                rows = [
+                    (rel_path, None, file_stat.st_mtime, 'synced', file_stat.st_size)  # Для FTP не используем хеш
+                    for _, rel_path, file_stat in self._scan_local_files(source_path)
+                ]
+                self.db_manager.bulk_update_file_states(config_id, rows)
+                live_paths = {row[0] for row in rows}
             
             elif direction == 'download':
                 # Обновляем состояния на основе файлов на FTP-сервере
                 ftp_files = self._get_ftp_files(target_path)
+                live_paths = set()
                 
                 for file_info in ftp_files:
                     ftp_path = file_info['path']
                     rel_path = os.path.relpath(ftp_path, target_path).replace("\\", "/")
                     local_file_path = os.path.join(source_path, rel_path)
+                    live_paths.add(rel_path)
                     
                     if os.path.exists(local_file_path):
                         self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                
-                # Удаляем из базы данных записи о файлах, которых больше нет на FTP-сервере
-                file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    ftp_path = os.path.join(target_path, state['file_path']).replace("\\", "/")
-                    
-                    # Проверяем, существует ли файл на FTP-сервере
-                    file_exists = False
-                    for file_info in ftp_files:
-                        if file_info['path'] == ftp_path:
-                            file_exists = True
-                            break
-                    
-                    if not file_exists:
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+            
+            else:
+                live_paths = None
+            
+            # Удаляем из базы данных записи о файлах, которых больше нет в источнике
+            if live_paths is not None:
+                db_paths = {state['file_path'] for state in self.db_manager.get_file_states(config_id)}
+                self.db_manager.delete_file_states(config_id, db_paths - live_paths)
             
             logger.info(f"Обновлены состояния файлов для конфигурации {config_id}")
             
@@ -1092,6 +1411,9 @@ class FTPSyncManager:
             'errors': []
         }
         
+        previous_state_index = self._state_index
+        self._state_index = self._load_state_index(config_id)
+        
         try:
             if direction == 'upload':
                 # Предпросмотр загрузки на FTP-сервер
@@ -1102,41 +1424,14 @@ class FTPSyncManager:
                 # Получаем списки файлов
                 local_files = self._get_local_files(source_path)
                 ftp_files = self._get_ftp_files(target_path)
+                ftp_by_path = {ftp_file['path']: ftp_file for ftp_file in ftp_files}
                 
-                # Файлы для загрузки
-                for rel_path, file_info in local_files.items():
-                    # Ищем файл на FTP-сервере
-                    ftp_path = os.path.join(target_path, rel_path).replace("\\", "/")
-                    remote_mtime = None
-                    remote_size = None
-                    
-                    for ftp_file in ftp_files:
-                        if ftp_file['path'] == ftp_path:
-                            remote_mtime = ftp_file['mtime']
-                            remote_size = ftp_file['size']
-                            break
-                    
-                    if remote_mtime is None or remote_size is None:
-                        # Файла нет на FTP-сервере, загружаем
-                        preview['to_upload'].append({
-                            'path': rel_path,
-                            'size': file_info['size'],
-                            'mtime': file_info['mtime']
-                        })
-                    else:
-                        # Файл есть на FTP-сервере, проверяем, нужно ли обновлять
-                        if self._need_upload(os.path.join(source_path, rel_path), remote_mtime, remote_size, config_id, rel_path):
-                            preview['to_update'].append({
-                                'path': rel_path,
-                                'size': file_info['size'],
-                                'mtime': file_info['mtime']
-                            })
-                        else:
-                            preview['to_skip'].append({
-                                'path': rel_path,
-                                'size': file_info['size'],
-                                'mtime': file_info['mtime']
-                            })
+                # Файлы для загрузки, обновления и пропуска
+                to_upload, to_update, to_skip = self._classify_upload_batch(
+                    local_files, ftp_by_path, config_id, target_path)
+                preview['to_upload'].extend(to_upload)
+                preview['to_update'].extend(to_update)
+                preview['to_skip'].extend(to_skip)
                 
                 # Файлы для удаления
                 for file_info in ftp_files:
@@ -1156,6 +1451,7 @@ class FTPSyncManager:
                 # Получаем списки файлов
                 local_files = self._get_local_files(source_path) if os.path.exists(source_path) else {}
                 ftp_files = self._get_ftp_files(target_path)
+                ftp_paths = {file_info['path'] for file_info in ftp_files}
                 
                 # Файлы для скачивания
                 for file_info in ftp_files:
@@ -1172,7 +1468,8 @@ class FTPSyncManager:
                     else:
                         # Файл есть локально, проверяем, нужно ли обновлять
                         local_file_path = os.path.join(source_path, rel_path)
-                        if self._need_download(ftp_path, local_file_path, config_id, rel_path):
+                        if self._need_download(local_file_path, file_info['mtime'], file_info['size'],
+                                               config_id, rel_path):
                             preview['to_download'].append({
                                 'path': rel_path,
                                 'size': file_info['size'],
@@ -1186,17 +1483,12 @@ class FTPSyncManager:
                             })
                 
                 # Файлы для удаления
+                target_prefix = self._remote_prefix(target_path)
                 for rel_path in local_files:
-                    ftp_path = os.path.join(target_path, rel_path).replace("\\", "/")
+                    ftp_path = target_prefix + rel_path.replace(os.sep, "/")
                     
                     # Проверяем, существует ли файл на FTP-сервере
-                    file_exists = False
-                    for file_info in ftp_files:
-                        if file_info['path'] == ftp_path:
-                            file_exists = True
-                            break
-                    
-                    if not file_exists:
+                    if ftp_path not in ftp_paths:
                         preview['to_delete'].append({
                             'path': rel_path,
                             'size': local_files[rel_path]['size'],
@@ -1208,5 +1500,8 @@ class FTPSyncManager:
         except Exception as e:
             preview['errors'].append(f"Ошибка при предварительном просмотре синхронизации: {e}")
             return preview
+        
+        finally:
+            self._state_index = previous_state_index
 
 FTPSync = FTPSyncManager
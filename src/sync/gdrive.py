@@ -1,7 +1,10 @@
 import os
-import json
 import time
+import random
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Callable, Any, Union
@@ -9,19 +12,68 @@ from typing import Dict, List, Tuple, Optional, Callable, Any, Union
 from src.sync.utils import FileUtils, TimeUtils, CryptoUtils, NetworkUtils
 
 try:
+    import httplib2
+    import google_auth_httplib2
     from google.oauth2 import service_account
     from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
     from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
     from google.auth.transport.requests import Request
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
-    import io
     GOOGLE_DRIVE_AVAILABLE = True
 except ImportError:
     GOOGLE_DRIVE_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Количество параллельных передач файлов по умолчанию (ограничивает число запросов в полете)
+DRIVE_MAX_WORKERS = 8
+# Размер части при возобновляемой загрузке файлов в Drive (кратен 256 КиБ;
+# часть целиком читается в память, поэтому при DRIVE_MAX_WORKERS потоках держим ее умеренной)
+DRIVE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Файлы не больше этого размера загружаются одним запросом без сессии возобновления
+DRIVE_RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+# Размер части при скачивании файлов из Drive (по умолчанию в googleapiclient 100 КиБ)
+DRIVE_DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Суффикс временного файла, в который идет скачивание до переименования в целевой
+DRIVE_PARTIAL_SUFFIX = '.part'
+# Размер буфера записи скачиваемого файла
+DRIVE_WRITE_BUFFER_SIZE = 1024 * 1024
+# Начиная с этого размера скачанный файл не удерживается в страничном кэше ОС
+DRIVE_FADVISE_THRESHOLD = 64 * 1024 * 1024
+# Размер блока чтения при вычислении MD5 локальных файлов
+DRIVE_HASH_BUFFER_SIZE = 1024 * 1024
+# Максимальное количество запросов в одном пакетном HTTP-запросе Drive API
+DRIVE_BATCH_SIZE = 100
+# Таймаут сокета HTTP-соединения с Drive API, секунды (по умолчанию httplib2 ждет бесконечно)
+DRIVE_HTTP_TIMEOUT = 60
+# Количество повторов запроса к Drive API при временных ошибках
+DRIVE_MAX_RETRIES = 5
+# HTTP-статусы, при которых запрос повторяется с экспоненциальной задержкой
+DRIVE_RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+# Причины ошибки 403, означающие превышение лимита запросов
+_RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+# Интервал полного перечитывания списка файлов Drive (между ними применяются изменения из Changes API), секунды
+DRIVE_FULL_LISTING_INTERVAL = 24 * 3600
+# Время, в течение которого построенный список файлов папки Drive используется повторно
+# (например, предпросмотр и следующая за ним синхронизация), секунды
+DRIVE_LISTING_TTL = 30
+# Форматы экспорта документов Google: MIME-тип документа -> (MIME-тип экспорта, расширение файла)
+EXPORT_MAP = {
+    'application/vnd.google-apps.document': ('application/pdf', '.pdf'),
+    'application/vnd.google-apps.spreadsheet': (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'
+    ),
+    'application/vnd.google-apps.presentation': (
+        'application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx'
+    ),
+}
+# Поля файла, которые запрашиваются при получении списка и изменений
+_DRIVE_FILE_FIELDS = 'id, name, parents, mimeType, modifiedTime, size, md5Checksum'
+_DRIVE_LIST_FIELDS = f'nextPageToken, files({_DRIVE_FILE_FIELDS})'
+_DRIVE_CHANGES_FIELDS = f'nextPageToken, newStartPageToken, changes(fileId, removed, file({_DRIVE_FILE_FIELDS}, trashed))'
+
 class GoogleDriveSyncManager:
     """Менеджер синхронизации с Google Drive"""
     
@@ -46,6 +98,24 @@ class GoogleDriveSyncManager:
             'errors': 0
         }
         self.current_sync_id = None
+        self._credentials = None
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._worker_local: Optional[threading.local] = None
+        self._folder_cache: Dict[Tuple[Optional[str], str], str] = {}
+        self._state_index: Optional[Dict[str, Dict[str, Any]]] = None
+        # Сохранять ли вычисленные MD5 в базе данных (только во время синхронизации, не предпросмотра)
+        self._persist_md5_cache = False
+        # Снимки диска по конфигурациям: подтвержденные успешной синхронизацией
+        # и полученные последним запросом списка, но еще не подтвержденные
+        self._drive_snapshots: Dict[int, Dict[str, Any]] = {}
+        self._pending_drive_snapshots: Dict[int, Dict[str, Any]] = {}
+        self._drive_listing_cache: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+        # Учетная запись, для которой построены снимок диска и кэш списков
+        self._auth_key: Optional[Tuple[str, str]] = None
+        self.max_workers = DRIVE_MAX_WORKERS
+        self.upload_chunk_size = DRIVE_UPLOAD_CHUNK_SIZE
+        self.download_chunk_size = DRIVE_DOWNLOAD_CHUNK_SIZE
     
     def authenticate(self, credentials_data: Optional[Dict[str, str]] = None, 
                     service_account_file: Optional[str] = None, 
@@ -71,7 +141,7 @@ class GoogleDriveSyncManager:
                 credentials = service_account.Credentials.from_service_account_file(
                     service_account_file, scopes=self.SCOPES
                 )
-                self.service = build('drive', 'v3', credentials=credentials)
+                self._set_service(credentials, ('service_account', os.path.abspath(service_account_file)))
                 logger.info("Аутентификация через сервисный аккаунт выполнена успешно")
                 return True
             
@@ -83,14 +153,14 @@ class GoogleDriveSyncManager:
                     # Сохраняем обновленный токен
                     with open(token_file, 'w') as token:
                         token.write(credentials.to_json())
-                self.service = build('drive', 'v3', credentials=credentials)
+                self._set_service(credentials, ('token', os.path.abspath(token_file)))
                 logger.info("Аутентификация через сохраненный токен выполнена успешно")
                 return True
             
             elif credentials_data:
                 # Аутентификация через OAuth2
                 if 'client_id' in credentials_data and 'client_secret' in credentials_data:
-                    # Создаем временный файл client_secret.json
+                    # Конфигурация клиента передается в flow напрямую, без временного client_secret.json
                     client_secret = {
                         "installed": {
                             "client_id": credentials_data['client_id'],
@@ -102,21 +172,15 @@ class GoogleDriveSyncManager:
                         }
                     }
                     
-                    with open('client_secret.json', 'w') as f:
-                        json.dump(client_secret, f)
-                    
-                    flow = InstalledAppFlow.from_client_secrets_file('client_secret.json', self.SCOPES)
+                    flow = InstalledAppFlow.from_client_config(client_secret, self.SCOPES)
                     credentials = flow.run_local_server(port=0)
                     
-                    # Удаляем временный файл
-                    os.remove('client_secret.json')
-                    
                     # Сохраняем токен для будущего использования
                     token_file = token_file or 'gdrive_token.json'
                     with open(token_file, 'w') as token:
                         token.write(credentials.to_json())
                     
-                    self.service = build('drive', 'v3', credentials=credentials)
+                    self._set_service(credentials, ('token', os.path.abspath(token_file)))
                     logger.info("Аутентификация через OAuth2 выполнена успешно")
                     return True
             
@@ -127,6 +191,36 @@ class GoogleDriveSyncManager:
             logger.error(f"Ошибка при аутентификации в Google Drive: {e}")
             return False
     
+    def _set_service(self, credentials, auth_key: Tuple[str, str]):
+        """
+        Создание клиента Drive API для полученных учетных данных
+        
+        SyncService выполняет аутентификацию перед каждой синхронизацией, поэтому
+        снимок диска и кэш списков сбрасываются только при смене учетной записи.
+        
+        Args:
+            credentials: Учетные данные Google
+            auth_key (Tuple[str, str]): Способ аутентификации и путь к файлу учетных данных
+        """
+        self.service = build('drive', 'v3', credentials=credentials)
+        self._credentials = credentials
+        self._local = threading.local()
+        
+        if auth_key != self._auth_key:
+            self._auth_key = auth_key
+            self._drive_snapshots = {}
+            self._pending_drive_snapshots = {}
+            self._drive_listing_cache = {}
+    
+    def _account_key(self) -> str:
+        """
+        Ключ текущей учетной записи для сохраненного в базе снимка диска
+        
+        Returns:
+            str: Хеш способа аутентификации и пути к файлу учетных данных
+        """
+        return CryptoUtils.hash_text(':'.join(self._auth_key or ()))
+    
     def get_or_create_folder(self, folder_name: str, parent_id: Optional[str] = None) -> Optional[str]:
         """
         Получение или создание папки в Google Drive
@@ -138,18 +232,25 @@ class GoogleDriveSyncManager:
         Returns:
             Optional[str]: ID папки
         """
+        cache_key = (parent_id, folder_name)
+        folder_id = self._folder_cache.get(cache_key)
+        if folder_id:
+            return folder_id
+        
         try:
-            # Ищем папку по имени
-            query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
+            # Ищем папку по имени (обратная косая черта и апостроф экранируются по правилам Drive API)
+            escaped_name = folder_name.replace('\\', '\\\\').replace("'", "\\'")
+            query = f"mimeType='application/vnd.google-apps.folder' and name='{escaped_name}' and trashed=false"
             if parent_id:
                 query += f" and '{parent_id}' in parents"
             
-            response = self.service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+            response = self._execute_with_retry(self.service.files().list(q=query, spaces='drive', fields='files(id)'))
             folders = response.get('files', [])
             
             if folders:
                 folder_id = folders[0].get('id')
                 logger.debug(f"Найдена существующая папка: {folder_name} (ID: {folder_id})")
+                self._folder_cache[cache_key] = folder_id
                 return folder_id
             
             # Если папка не найдена, создаем ее
@@ -161,15 +262,178 @@ class GoogleDriveSyncManager:
             if parent_id:
                 folder_metadata['parents'] = [parent_id]
             
-            folder = self.service.files().create(body=folder_metadata, fields='id').execute()
+            folder = self._execute_with_retry(self.service.files().create(body=folder_metadata, fields='id'))
             folder_id = folder.get('id')
             logger.info(f"Создана новая папка: {folder_name} (ID: {folder_id})")
+            self._folder_cache[cache_key] = folder_id
+            self.invalidate_drive_listing()
             return folder_id
             
         except Exception as e:
             logger.error(f"Ошибка при получении/создании папки {folder_name}: {e}")
             return None
     
+    def _get_service(self):
+        """
+        Получение сервиса Google Drive для текущего потока
+        
+        Объект httplib2.Http внутри сервиса не потокобезопасен, поэтому
+        каждый рабочий поток использует собственный экземпляр сервиса, а вместе
+        с ним и собственное соединение, которое переиспользуется между файлами.
+        
+        Returns:
+            Resource: Сервис Google Drive
+        """
+        if self._credentials is None:
+            return self.service
+        
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build('drive', 'v3', http=self._build_authorized_http(), cache_discovery=False)
+            self._local.service = service
+        return service
+    
+    def _build_authorized_http(self):
+        """
+        Создание авторизованного HTTP-клиента для рабочего потока
+        
+        Returns:
+            google_auth_httplib2.AuthorizedHttp: HTTP-клиент с учетными данными и таймаутом
+        """
+        return google_auth_httplib2.AuthorizedHttp(
+            self._credentials, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT)
+        )
+    
+    def _execute_with_retry(self, request, max_retries: int = DRIVE_MAX_RETRIES):
+        """
+        Выполнение запроса к Drive API с повторами при временных ошибках
+        
+        При превышении лимитов (403 rateLimitExceeded, 429) и ошибках сервера (5xx)
+        запрос повторяется с экспоненциальной задержкой и случайным разбросом.
+        
+        Args:
+            request: Запрос googleapiclient (HttpRequest)
+            max_retries (int): Максимальное количество повторов
+            
+        Returns:
+            Any: Результат выполнения запроса
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                return request.execute()
+            except HttpError as e:
+                status = int(getattr(e.resp, 'status', 0) or 0)
+                if status not in DRIVE_RETRY_STATUSES or attempt == max_retries:
+                    raise
+                # 403 повторяем только при превышении лимита запросов
+                content = e.content or b''
+                if status == 403 and not any(reason in content for reason in _RATE_LIMIT_REASONS):
+                    raise
+                
+                delay = min(64, (2 ** attempt) + random.random())
+                logger.warning(f"Временная ошибка Google Drive (HTTP {status}), повтор через {delay:.1f} с")
+                time.sleep(delay)
+    
+    def _increment_stat(self, key: str, value: int = 1):
+        """
+        Потокобезопасное увеличение счетчика статистики
+        
+        В рабочих потоках _run_parallel счетчики накапливаются локально в потоке
+        и сливаются в sync_stats по завершении, без общей блокировки на каждый файл.
+        
+        Args:
+            key (str): Ключ счетчика в sync_stats
+            value (int): Величина приращения
+        """
+        worker_local = self._worker_local
+        stats = getattr(worker_local, 'stats', None) if worker_local is not None else None
+        if stats is not None:
+            stats[key] += value
+            return
+        
+        with self._stats_lock:
+            self.sync_stats[key] += value
+    
+    def _run_parallel(self, tasks: List[Tuple[Callable[..., None], tuple]]):
+        """
+        Параллельное выполнение передач файлов
+        
+        Args:
+            tasks (List[Tuple[Callable[..., None], tuple]]): Список пар (функция, аргументы)
+        """
+        if not tasks:
+            return
+        
+        worker_local = threading.local()
+        worker_stats: List[Counter] = []
+        
+        def _run_task(func: Callable[..., None], args: tuple):
+            if getattr(worker_local, 'stats', None) is None:
+                worker_local.stats = Counter()
+                with self._stats_lock:
+                    worker_stats.append(worker_local.stats)
+            func(*args)
+        
+        self._worker_local = worker_local
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+                futures = [executor.submit(_run_task, func, args) for func, args in tasks]
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Ошибка при выполнении передачи файла: {e}")
+                        self._increment_stat('errors')
+        finally:
+            self._worker_local = None
+            # Потоки пула завершены, сливаем их счетчики в общую статистику
+            with self._stats_lock:
+                for stats in worker_stats:
+                    for key, value in stats.items():
+                        self.sync_stats[key] += value
+    
+    def _upload_task(self, config_id: int, local_file_path: str, rel_path: str, drive_file_name: str,
+                     drive_parent_id: str, file_id: Optional[str],
+                     callback: Optional[Callable[[str, str], None]] = None):
+        """
+        Загрузка одного файла в рабочем потоке
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            local_file_path (str): Путь к локальному файлу
+            rel_path (str): Относительный путь к файлу
+            drive_file_name (str): Имя файла в Google Drive
+            drive_parent_id (str): ID родительской папки в Google Drive
+            file_id (Optional[str]): ID файла для обновления (None для новой загрузки)
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+        """
+        if self._upload_file(local_file_path, drive_file_name, drive_parent_id, file_id, callback):
+            self._increment_stat('updated' if file_id else 'uploaded')
+            
+            # Обновляем состояние файла в базе данных
+            self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+    
+    def _download_task(self, config_id: int, file_id: str, local_file_path: str, rel_path: str,
+                       callback: Optional[Callable[[str, str], None]] = None,
+                       drive_file_info: Optional[Dict[str, Any]] = None):
+        """
+        Скачивание одного файла в рабочем потоке
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            file_id (str): ID файла в Google Drive
+            local_file_path (str): Путь для сохранения файла
+            rel_path (str): Относительный путь к файлу
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            drive_file_info (Optional[Dict[str, Any]]): Информация о файле из _get_drive_files
+        """
+        if self._download_file(file_id, local_file_path, callback, drive_file_info):
+            self._increment_stat('downloaded')
+            
+            # Обновляем состояние файла в базе данных; MD5 скачанного содержимого известен из Drive
+            file_hash = drive_file_info.get('md5_checksum') if drive_file_info else None
+            self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced', file_hash=file_hash)
+    
     def sync_folders(self, config_id: int, source_path: str, target_folder_id: str, 
                     callback: Optional[Callable[[str, str], None]] = None, 
                     direction: str = 'upload', delete_mode: bool = True) -> Dict[str, int]:
@@ -194,6 +458,9 @@ class GoogleDriveSyncManager:
                 callback(f"Ошибка: {error_msg}", "error")
             return self.sync_stats
         
+        # Папки могли измениться с прошлой синхронизации
+        self._folder_cache = {}
+        
         # Сброс статистики
         self.sync_stats = {
             'uploaded': 0,
@@ -229,6 +496,10 @@ class GoogleDriveSyncManager:
             return self.sync_stats
         
         try:
+            # Состояния файлов загружаем из базы один раз на всю синхронизацию
+            self._state_index = self._load_state_index(config_id)
+            self._persist_md5_cache = True
+            
             if direction == 'upload':
                 # Синхронизация из локальной папки в Google Drive
                 self._sync_upload(config_id, source_path, target_folder_id, callback, delete_mode)
@@ -272,6 +543,11 @@ class GoogleDriveSyncManager:
                     files_count=total_files
                 )
             
+            # Токен изменений сохраняется только после успешной синхронизации,
+            # иначе следующая синхронизация повторно получит те же изменения
+            if self.sync_stats['errors'] == 0:
+                self._commit_drive_snapshot(config_id)
+            
             return self.sync_stats
             
         except Exception as e:
@@ -291,6 +567,11 @@ class GoogleDriveSyncManager:
                 )
             
             return self.sync_stats
+        
+        finally:
+            self._state_index = None
+            self._persist_md5_cache = False
+            self._pending_drive_snapshots.pop(config_id, None)
     
     def _sync_upload(self, config_id: int, source_path: str, target_folder_id: str, 
                     callback: Optional[Callable[[str, str], None]] = None, 
@@ -305,81 +586,76 @@ class GoogleDriveSyncManager:
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
             delete_mode (bool): Удалять ли файлы, отсутствующие в источнике
         """
-        # Получаем список файлов в Google Drive
-        drive_files = self._get_drive_files(target_folder_id)
+        # Получаем списки файлов в Google Drive и в локальной папке одновременно
+        drive_files, local_files = self._get_file_lists(target_folder_id, source_path, config_id)
+        
+        # Индекс (родитель, имя) -> ID; при дубликатах имен берется первый файл, как и раньше
+        drive_index = {}
+        for fid, info in drive_files.items():
+            drive_index.setdefault((info['parent_id'], info['name']), fid)
         
-        # Синхронизируем файлы из локальной папки в Google Drive
-        for root, dirs, files in os.walk(source_path):
-            # Пропускаем скрытые папки
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
+        # Сопоставляем локальные файлы с файлами в Google Drive
+        pending = []
+        for rel_path in local_files:
+            local_file_path = os.path.join(source_path, rel_path)
+            
+            # Определяем путь в Google Drive
+            drive_path_parts = rel_path.split(os.sep)
+            drive_parent_id = target_folder_id
+            
+            # Создаем структуру папок в Google Drive
+            for folder_name in drive_path_parts[:-1]:
+                drive_parent_id = self.get_or_create_folder(folder_name, drive_parent_id)
+                if not drive_parent_id:
+                    error_msg = f"Не удалось создать папку: {folder_name}"
+                    logger.error(error_msg)
+                    if callback:
+                        callback(error_msg, "error")
+                    self.sync_stats['errors'] += 1
+                    break
             
-            for filename in files:
-                # Пропускаем скрытые файлы
-                if filename.startswith('.'):
-                    continue
-                    
-                local_file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(local_file_path, source_path)
-                
-                # Определяем путь в Google Drive
-                drive_path_parts = rel_path.split(os.sep)
-                drive_parent_id = target_folder_id
-                
-                # Создаем структуру папок в Google Drive
-                for folder_name in drive_path_parts[:-1]:
-                    drive_parent_id = self.get_or_create_folder(folder_name, drive_parent_id)
-                    if not drive_parent_id:
-                        error_msg = f"Не удалось создать папку: {folder_name}"
-                        logger.error(error_msg)
-                        if callback:
-                            callback(error_msg, "error")
-                        self.sync_stats['errors'] += 1
-                        continue
-                
-                # Имя файла в Google Drive
-                drive_file_name = drive_path_parts[-1]
-                
-                # Проверяем, существует ли файл в Google Drive
-                file_id = None
-                for fid, file_info in drive_files.items():
-                    if file_info['name'] == drive_file_name and file_info['parent_id'] == drive_parent_id:
-                        file_id = fid
-                        break
-                
-                if file_id:
-                    # Файл существует в Google Drive, проверяем, нужно ли обновлять
-                    if self._need_upload(local_file_path, file_id, config_id, rel_path):
-                        if self._upload_file(local_file_path, drive_file_name, drive_parent_id, file_id, callback):
-                            self.sync_stats['updated'] += 1
-                            
-                            # Обновляем состояние файла в базе данных
-                            self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                    else:
-                        self.sync_stats['skipped'] += 1
-                        debug_msg = f"Файл пропущен (без изменений): {rel_path}"
-                        logger.debug(debug_msg)
-                        if callback:
-                            callback(debug_msg, "debug")
-                else:
-                    # Файла нет в Google Drive, загружаем
-                    if self._upload_file(local_file_path, drive_file_name, drive_parent_id, None, callback):
-                        self.sync_stats['uploaded'] += 1
-                        
-                        # Обновляем состояние файла в базе данных
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+            if not drive_parent_id:
+                continue
+            
+            # Имя файла в Google Drive
+            drive_file_name = drive_path_parts[-1]
+            
+            # Проверяем, существует ли файл в Google Drive
+            file_id = drive_index.get((drive_parent_id, drive_file_name))
+            
+            pending.append((local_file_path, rel_path, drive_file_name, drive_parent_id, file_id))
+        
+        # Определяем файлы для загрузки/обновления
+        uploads = []
+        for local_file_path, rel_path, drive_file_name, drive_parent_id, file_id in pending:
+            # Файл существует в Google Drive, проверяем, нужно ли обновлять
+            if file_id and not self._need_upload(local_file_path, drive_files[file_id], config_id, rel_path,
+                                                 local_files[rel_path].get('stat')):
+                self.sync_stats['skipped'] += 1
+                debug_msg = f"Файл пропущен (без изменений): {rel_path}"
+                logger.debug(debug_msg)
+                if callback:
+                    callback(debug_msg, "debug")
+                continue
+            
+            uploads.append((self._upload_task, (config_id, local_file_path, rel_path, drive_file_name,
+                                                drive_parent_id, file_id, callback)))
+        
+        # Загружаем файлы в Google Drive параллельно
+        self._run_parallel(uploads)
         
         # Удаляем файлы, которые есть в Google Drive, но отсутствуют локально
         if delete_mode:
+            # Файлы из обхода есть локально без проверки; os.path.exists нужен только
+            # для остальных (например, скрытых файлов, которые обход пропускает)
+            deletions = []
             for file_id, file_info in drive_files.items():
                 rel_path = file_info['rel_path']
-                local_file_path = os.path.join(source_path, rel_path)
                 
-                if not os.path.exists(local_file_path):
-                    if self._delete_file(file_id, callback):
-                        self.sync_stats['deleted'] += 1
-                        
-                        # Удаляем состояние файла из базы данных
-                        self.db_manager.delete_file_state(config_id, rel_path)
+                if rel_path not in local_files and not os.path.exists(os.path.join(source_path, rel_path)):
+                    deletions.append((file_id, file_info['name'], rel_path))
+            
+            self._delete_files_batch(config_id, deletions, callback)
     
     def _sync_download(self, config_id: int, target_path: str, source_folder_id: str, 
                      callback: Optional[Callable[[str, str], None]] = None, 
@@ -410,23 +686,23 @@ class GoogleDriveSyncManager:
                 self.sync_stats['errors'] += 1
                 return
         
-        # Получаем список файлов в Google Drive
-        drive_files = self._get_drive_files(source_folder_id)
-        
-        # Получаем список локальных файлов
-        local_files = self._get_local_files(target_path)
+        # Получаем списки файлов в Google Drive и в локальной папке одновременно
+        drive_files, local_files = self._get_file_lists(source_folder_id, target_path, config_id)
         
         # Синхронизируем файлы из Google Drive в локальную папку
+        downloads = []
+        # Каталоги, которые уже проверены или созданы, повторно не проверяются для каждого файла
+        known_dirs = {target_path}
         for file_id, file_info in drive_files.items():
             rel_path = file_info['rel_path']
             local_file_path = os.path.join(target_path, rel_path)
             
             # Создаем подкаталоги, если необходимо
             target_dir = os.path.dirname(local_file_path)
-            if not os.path.exists(target_dir):
+            if target_dir not in known_dirs:
                 try:
-                    os.makedirs(target_dir)
-                    logger.debug(f"Создан подкаталог: {target_dir}")
+                    os.makedirs(target_dir, exist_ok=True)
+                    known_dirs.add(target_dir)
                 except Exception as e:
                     error_msg = f"Ошибка при создании подкаталога {target_dir}: {e}"
                     logger.error(error_msg)
@@ -435,46 +711,101 @@ class GoogleDriveSyncManager:
                     self.sync_stats['errors'] += 1
                     continue
             
-            # Проверяем, существует ли файл локально
-            if rel_path not in local_files:
-                # Файла нет локально, скачиваем
-                if self._download_file(file_id, local_file_path, callback):
-                    self.sync_stats['downloaded'] += 1
-                    
-                    # Обновляем состояние файла в базе данных
-                    self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-            else:
-                # Файл есть локально, проверяем, нужно ли обновлять
-                if self._need_download(file_id, local_file_path, config_id, rel_path):
-                    if self._download_file(file_id, local_file_path, callback):
-                        self.sync_stats['downloaded'] += 1
-                        
-                        # Обновляем состояние файла в базе данных
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                else:
-                    self.sync_stats['skipped'] += 1
-                    debug_msg = f"Файл пропущен (без изменений): {rel_path}"
-                    logger.debug(debug_msg)
-                    if callback:
-                        callback(debug_msg, "debug")
+            # Файл есть локально, проверяем, нужно ли обновлять
+            if rel_path in local_files and not self._need_download(file_info, local_file_path, config_id, rel_path,
+                                                                   local_files[rel_path].get('stat')):
+                self.sync_stats['skipped'] += 1
+                debug_msg = f"Файл пропущен (без изменений): {rel_path}"
+                logger.debug(debug_msg)
+                if callback:
+                    callback(debug_msg, "debug")
+                continue
+            
+            downloads.append((self._download_task, (config_id, file_id, local_file_path, rel_path, callback, file_info)))
+        
+        # Скачиваем файлы из Google Drive параллельно
+        self._run_parallel(downloads)
         
         # Удаляем файлы, которые есть локально, но отсутствуют в Google Drive
         if delete_mode:
-            for rel_path in local_files:
-                if rel_path not in {info['rel_path'] for info in drive_files.values()}:
-                    local_file_path = os.path.join(target_path, rel_path)
-                    if self._delete_local_file(local_file_path, callback):
-                        self.sync_stats['deleted'] += 1
-                        
-                        # Удаляем состояние файла из базы данных
-                        self.db_manager.delete_file_state(config_id, rel_path)
+            drive_rel_paths = {info['rel_path'] for info in drive_files.values()}
+            deleted_paths = []
+            for rel_path in local_files.keys() - drive_rel_paths:
+                local_file_path = os.path.join(target_path, rel_path)
+                if self._delete_local_file(local_file_path, callback):
+                    self.sync_stats['deleted'] += 1
+                    deleted_paths.append(rel_path)
+            
+            # Удаляем состояния файлов из базы данных одной транзакцией
+            if deleted_paths:
+                self.db_manager.delete_file_states(config_id, deleted_paths)
+    
+    def _get_file_lists(self, folder_id: str, local_path: str,
+                        config_id: Optional[int] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Параллельное получение списков файлов в Google Drive и в локальной папке
+        
+        Запрос к Drive ограничен сетью, обход локальной папки - диском,
+        поэтому они выполняются одновременно.
+        
+        Args:
+            folder_id (str): ID папки в Google Drive
+            local_path (str): Путь к локальной папке
+            config_id (Optional[int]): ID конфигурации, для которой ведется снимок диска
+            
+        Returns:
+            Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]: Файлы в Google Drive и локальные файлы
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            drive_future = executor.submit(self._get_drive_files_cached, folder_id, config_id)
+            local_files = self._get_local_files(local_path)
+            return drive_future.result(), local_files
     
-    def _get_drive_files(self, folder_id: str) -> Dict[str, Dict[str, Any]]:
+    def _get_drive_files_cached(self, folder_id: str, config_id: Optional[int] = None,
+                                ttl: float = DRIVE_LISTING_TTL) -> Dict[str, Dict[str, Any]]:
+        """
+        Получение списка файлов в папке Google Drive с кэшированием на ttl секунд
+        
+        Args:
+            folder_id (str): ID папки в Google Drive
+            config_id (Optional[int]): ID конфигурации, для которой ведется снимок диска
+            ttl (float): Время жизни кэша в секундах
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Словарь с информацией о файлах {file_id: file_info}
+        """
+        cached = self._drive_listing_cache.get(folder_id)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        
+        drive_files = self._get_drive_files(folder_id, config_id)
+        if drive_files:
+            self._drive_listing_cache[folder_id] = (time.monotonic(), drive_files)
+        return drive_files
+    
+    def invalidate_drive_listing(self, folder_id: Optional[str] = None):
+        """
+        Сброс кэша списков файлов Google Drive
+        
+        Args:
+            folder_id (Optional[str]): ID папки; если не указан, сбрасывается кэш всех папок
+        """
+        if folder_id is None:
+            self._drive_listing_cache.clear()
+        else:
+            self._drive_listing_cache.pop(folder_id, None)
+    
+    def _get_drive_files(self, folder_id: str, config_id: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
         """
         Получение списка файлов в папке Google Drive
         
+        Вместо рекурсивного обхода (один запрос на каждую папку) выполняется
+        один постраничный запрос по всему диску, а дерево восстанавливается
+        на клиенте итеративным обходом от folder_id.
+        
         Args:
             folder_id (str): ID папки в Google Drive
+            config_id (Optional[int]): ID конфигурации, для которой ведется снимок диска
             
         Returns:
             Dict[str, Dict[str, Any]]: Словарь с информацией о файлах {file_id: file_info}
@@ -482,48 +813,48 @@ class GoogleDriveSyncManager:
         drive_files = {}
         
         try:
-            # Рекурсивно получаем все файлы в папке и подпапках
-            query = f"'{folder_id}' in parents and trashed=false"
-            page_token = None
-            
-            while True:
-                response = self.service.files().list(
-                    q=query,
-                    spaces='drive',
-                    fields='nextPageToken, files(id, name, parents, mimeType, modifiedTime, size)',
-                    pageToken=page_token
-                ).execute()
+            # Группируем файлы диска по родительским папкам
+            children = {}
+            for file in self._list_drive_entries(config_id).values():
+                parents = file.get('parents')
+                if parents:
+                    children.setdefault(parents[0], []).append(file)
+            
+            # Итеративный обход дерева от корневой папки, пути папок вычисляются один раз
+            folder_paths = {folder_id: ''}
+            queue = [folder_id]
+            
+            while queue:
+                parent_id = queue.pop()
+                parent_path = folder_paths[parent_id]
                 
-                files = response.get('files', [])
-                
-                for file in files:
+                for file in children.get(parent_id, ()):
                     file_id = file.get('id')
                     file_name = file.get('name')
-                    parent_id = file.get('parents', [None])[0]
                     mime_type = file.get('mimeType')
-                    modified_time = file.get('modifiedTime')
-                    size = file.get('size')
+                    rel_path = os.path.join(parent_path, file_name) if parent_path else file_name
                     
-                    # Если это папка, рекурсивно получаем ее содержимое
                     if mime_type == 'application/vnd.google-apps.folder':
-                        subfolder_files = self._get_drive_files(file_id)
-                        drive_files.update(subfolder_files)
+                        # Защита от циклов в графе родителей
+                        if file_id not in folder_paths:
+                            folder_paths[file_id] = rel_path
+                            queue.append(file_id)
+                        # Известные папки не придется искать в get_or_create_folder
+                        self._folder_cache.setdefault((parent_id, file_name), file_id)
                     else:
-                        # Определяем относительный путь файла
-                        rel_path = self._get_relative_path(file_id, folder_id)
-                        
+                        modified_time = file.get('modifiedTime')
                         drive_files[file_id] = {
                             'name': file_name,
                             'parent_id': parent_id,
                             'mime_type': mime_type,
                             'modified_time': modified_time,
-                            'size': size,
+                            # Время модификации разбирается один раз при построении списка
+                            'modified_time_epoch': TimeUtils.parse_iso8601(modified_time) if modified_time else 0,
+                            # У документов Google размера нет, для них 0
+                            'size': int(file.get('size') or 0),
+                            'md5_checksum': file.get('md5Checksum'),
                             'rel_path': rel_path
                         }
-                
-                page_token = response.get('nextPageToken', None)
-                if not page_token:
-                    break
             
             return drive_files
             
@@ -531,10 +862,189 @@ class GoogleDriveSyncManager:
             logger.error(f"Ошибка при получении списка файлов из Google Drive: {e}")
             return {}
     
+    def _list_drive_entries(self, config_id: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Получение всех файлов диска с учетом сохраненного снимка
+        
+        Первый запрос конфигурации (и раз в DRIVE_FULL_LISTING_INTERVAL секунд) читает
+        весь диск, последующие применяют к копии снимка только изменения из Changes API,
+        начиная с сохраненного токена страницы. Результат становится ожидающим снимком
+        и сохраняется вместе с новым токеном в _commit_drive_snapshot после успешной
+        синхронизации: в базу записываются только измененные файлы.
+        
+        Args:
+            config_id (Optional[int]): ID конфигурации (без него всегда читается весь диск)
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Словарь {file_id: метаданные файла из API}
+        """
+        snapshot = self._get_drive_snapshot(config_id) if config_id is not None else None
+        
+        pending = None
+        if snapshot is not None and time.time() - snapshot['loaded'] < DRIVE_FULL_LISTING_INTERVAL:
+            try:
+                pending = self._apply_drive_changes(snapshot)
+            except Exception as e:
+                # Например, токен устарел или снимок принадлежит другой учетной записи
+                logger.warning(f"Не удалось получить изменения Google Drive, выполняется полное чтение: {e}")
+        
+        if pending is None:
+            # Токен берем до чтения списка, чтобы не пропустить изменения во время чтения
+            page_token = self._execute_with_retry(self.service.changes().getStartPageToken())['startPageToken']
+            entries = {file['id']: file for file in self._list_drive_query("trashed=false")}
+            pending = {'entries': entries, 'page_token': page_token, 'loaded': time.time(),
+                       'changed': {}, 'removed': set(), 'full': True}
+        
+        if config_id is not None:
+            self._pending_drive_snapshots[config_id] = pending
+        return pending['entries']
+    
+    def _get_drive_snapshot(self, config_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение подтвержденного снимка диска конфигурации
+        
+        После перезапуска приложения снимок загружается из базы данных, если он
+        сохранен для текущей учетной записи.
+        
+        Args:
+            config_id (int): ID конфигурации
+            
+        Returns:
+            Optional[Dict[str, Any]]: Снимок {entries, page_token, loaded} или None
+        """
+        snapshot = self._drive_snapshots.get(config_id)
+        if snapshot is None:
+            try:
+                snapshot = self.db_manager.get_drive_change_state(config_id, self._account_key())
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке снимка Google Drive из базы данных: {e}")
+                snapshot = None
+            if snapshot is not None:
+                self._drive_snapshots[config_id] = snapshot
+        return snapshot
+    
+    def _apply_drive_changes(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Применение изменений из Changes API к копии снимка
+        
+        Args:
+            snapshot (Dict[str, Any]): Подтвержденный снимок {entries, page_token, loaded}
+            
+        Returns:
+            Dict[str, Any]: Новый снимок с токеном, следующим за примененными изменениями,
+            и списками измененных и удаленных файлов
+        """
+        # Подтвержденный снимок не меняется, пока синхронизация не завершится успешно
+        entries = dict(snapshot['entries'])
+        changed: Dict[str, Dict[str, Any]] = {}
+        removed = set()
+        page_token = snapshot['page_token']
+        new_page_token = page_token
+        
+        while True:
+            response = self._execute_with_retry(self.service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                fields=_DRIVE_CHANGES_FIELDS,
+                pageSize=1000
+            ))
+            
+            for change in response.get('changes', []):
+                file = change.get('file')
+                if change.get('removed') or not file or file.get('trashed'):
+                    file_id = change.get('fileId')
+                    entries.pop(file_id, None)
+                    changed.pop(file_id, None)
+                    removed.add(file_id)
+                else:
+                    entries[file['id']] = file
+                    changed[file['id']] = file
+                    removed.discard(file['id'])
+            
+            if 'newStartPageToken' in response:
+                new_page_token = response['newStartPageToken']
+                break
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        return {'entries': entries, 'page_token': new_page_token, 'loaded': snapshot['loaded'],
+                'changed': changed, 'removed': removed, 'full': False}
+    
+    def _forget_drive_entry(self, file_id: str):
+        """
+        Удаление файла из ожидающих снимков диска после его удаления в Google Drive
+        
+        Args:
+            file_id (str): ID удаленного файла
+        """
+        for snapshot in self._pending_drive_snapshots.values():
+            snapshot['entries'].pop(file_id, None)
+            snapshot['changed'].pop(file_id, None)
+            snapshot['removed'].add(file_id)
+    
+    def _commit_drive_snapshot(self, config_id: int):
+        """
+        Подтверждение снимка диска после успешной синхронизации
+        
+        Токен изменений и измененные файлы снимка сохраняются в базе данных вместе
+        с ключом учетной записи, чтобы следующая синхронизация (в том числе после
+        перезапуска) запросила только новые изменения.
+        
+        Args:
+            config_id (int): ID конфигурации
+        """
+        pending = self._pending_drive_snapshots.pop(config_id, None)
+        if pending is None:
+            return
+        
+        self._drive_snapshots[config_id] = pending
+        try:
+            self.db_manager.save_drive_change_state(
+                config_id, self._account_key(), pending['page_token'], pending['loaded'],
+                pending['entries'] if pending['full'] else pending['changed'],
+                pending['removed'], replace=pending['full']
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении снимка Google Drive в базе данных: {e}")
+            # Без сохраненных изменений снимок в базе отстает, следующая синхронизация читает весь диск
+            self._drive_snapshots.pop(config_id, None)
+    
+    def _list_drive_query(self, query: str):
+        """
+        Постраничное выполнение запроса files().list
+        
+        Args:
+            query (str): Условие поиска Drive API
+            
+        Yields:
+            Dict[str, Any]: Метаданные файла
+        """
+        page_token = None
+        
+        while True:
+            response = self._execute_with_retry(self.service.files().list(
+                q=query,
+                corpora='user',
+                spaces='drive',
+                fields=_DRIVE_LIST_FIELDS,
+                pageSize=1000,
+                pageToken=page_token
+            ))
+            
+            yield from response.get('files', [])
+            
+            page_token = response.get('nextPageToken', None)
+            if not page_token:
+                break
+    
     def _get_local_files(self, folder_path: str) -> Dict[str, Dict[str, Any]]:
         """
         Получение списка всех файлов в локальной папке и подпапках
         
+        Подпапки верхнего уровня обходятся параллельно: на сетевых и медленных
+        дисках время обхода определяется задержкой чтения каталогов.
+        
         Args:
             folder_path (str): Путь к папке
             
@@ -543,122 +1053,186 @@ class GoogleDriveSyncManager:
         """
         files = {}
         
-        for root, dirs, filenames in os.walk(folder_path):
-            # Пропускаем скрытые папки
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for filename in filenames:
-                # Пропускаем скрытые файлы
-                if filename.startswith('.'):
-                    continue
-                    
-                file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(file_path, folder_path)
-                
-                try:
-                    stat = os.stat(file_path)
-                    files[rel_path] = {
-                        'size': stat.st_size,
-                        'mtime': stat.st_mtime,
-                        'is_dir': False
-                    }
-                except Exception as e:
-                    logger.error(f"Ошибка при получении информации о файле {file_path}: {e}")
+        try:
+            with os.scandir(folder_path) as entries:
+                top_entries = [entry for entry in entries if not entry.name.startswith('.')]
+        except OSError as e:
+            logger.error(f"Ошибка при чтении папки {folder_path}: {e}")
+            return files
+        
+        subdirs = []
+        for entry in top_entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'is_dir': False, 'stat': stat}
+            except OSError as e:
+                logger.error(f"Ошибка при получении информации о файле {entry.path}: {e}")
+        
+        if not subdirs:
+            return files
+        
+        def _scan_subtree(subdir: str) -> List[Tuple[str, os.stat_result]]:
+            return [(rel_path, stat) for _, rel_path, stat in self._scan_local_files(subdir, folder_path)]
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(subdirs)))) as executor:
+            for subtree in executor.map(_scan_subtree, subdirs):
+                for rel_path, stat in subtree:
+                    files[rel_path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'is_dir': False, 'stat': stat}
         
         return files
     
-    def _get_relative_path(self, file_id: str, root_folder_id: str) -> str:
+    def _scan_local_files(self, folder_path: str, root_path: Optional[str] = None):
         """
-        Получение относительного пути файла в Google Drive
+        Рекурсивный обход локальной папки через os.scandir
+        
+        Данные stat берутся из DirEntry, поэтому повторный os.stat для каждого
+        файла не нужен.
         
         Args:
-            file_id (str): ID файла
-            root_folder_id (str): ID корневой папки
+            folder_path (str): Путь к папке
+            root_path (Optional[str]): Папка, от которой считаются относительные пути
+                (по умолчанию folder_path)
+            
+        Yields:
+            Tuple[str, str, os.stat_result]: Полный путь, относительный путь и stat файла
+        """
+        prefix_len = len(os.path.join(root_path or folder_path, ''))
+        pending_dirs = [folder_path]
+        
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        # Пропускаем скрытые файлы и папки
+                        if entry.name.startswith('.'):
+                            continue
+                        
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                            elif entry.is_file():
+                                yield entry.path, entry.path[prefix_len:], entry.stat()
+                        except OSError as e:
+                            logger.error(f"Ошибка при получении информации о файле {entry.path}: {e}")
+            except OSError as e:
+                logger.error(f"Ошибка при чтении папки {current_dir}: {e}")
+    
+    def _load_state_index(self, config_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузка состояний файлов конфигурации одним запросом
+        
+        Args:
+            config_id (int): ID конфигурации
             
         Returns:
-            str: Относительный путь файла
+            Dict[str, Dict[str, Any]]: Состояния файлов по относительному пути
         """
-        try:
-            path_parts = []
-            current_id = file_id
-            
-            while current_id != root_folder_id:
-                # Получаем информацию о файле/папке
-                file_info = self.service.files().get(
-                    fileId=current_id,
-                    fields='id, name, parents'
-                ).execute()
-                
-                # Добавляем имя файла/папки в путь
-                path_parts.insert(0, file_info.get('name'))
-                
-                # Переходим к родительской папке
-                parents = file_info.get('parents', [])
-                if not parents:
-                    break
-                
-                current_id = parents[0]
-                
-                # Защита от бесконечного цикла
-                if len(path_parts) > 20:  # Максимальная глубина вложенности
-                    break
+        return {state['file_path']: state for state in self.db_manager.get_file_states(config_id)}
+    
+    def _get_file_state(self, config_id: int, rel_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Получение сохраненного состояния файла
+        
+        Во время синхронизации и предпросмотра используется индекс из _load_state_index,
+        иначе выполняется запрос к базе данных.
+        
+        Args:
+            config_id (int): ID конфигурации
+            rel_path (str): Относительный путь к файлу
             
-            return os.path.join(*path_parts)
+        Returns:
+            Optional[Dict[str, Any]]: Состояние файла или None
+        """
+        if self._state_index is not None:
+            return self._state_index.get(rel_path)
+        return self.db_manager.get_file_state(config_id, rel_path)
+    
+    def _get_local_md5(self, config_id: int, rel_path: str, file_path: str, file_stat: os.stat_result) -> str:
+        """
+        Получение MD5 локального файла с кэшированием в базе данных
+        
+        Хеш берется из file_states, если inode, размер и время модификации файла
+        не изменились с момента его вычисления. Во время предпросмотра новый хеш
+        запоминается только в индексе состояний и в базу не записывается.
+        
+        Args:
+            config_id (int): ID конфигурации
+            rel_path (str): Относительный путь к файлу
+            file_path (str): Полный путь к файлу
+            file_stat (os.stat_result): Результат stat для файла
             
-        except Exception as e:
-            logger.error(f"Ошибка при получении относительного пути для файла {file_id}: {e}")
-            return ""
+        Returns:
+            str: MD5 файла в шестнадцатеричном виде
+        """
+        state = self._get_file_state(config_id, rel_path)
+        if (state and state.get('file_hash')
+                and state.get('inode') == file_stat.st_ino
+                and state.get('file_size') == file_stat.st_size
+                and state.get('modified_time') == file_stat.st_mtime):
+            return state['file_hash']
+        
+        file_hash = FileUtils.get_file_hash(file_path, 'md5', DRIVE_HASH_BUFFER_SIZE)
+        if file_hash and self._persist_md5_cache:
+            self.db_manager.update_file_state(
+                config_id=config_id,
+                file_path=rel_path,
+                file_hash=file_hash,
+                modified_time=file_stat.st_mtime,
+                sync_status=state.get('sync_status') if state else None,
+                file_size=file_stat.st_size,
+                inode=file_stat.st_ino
+            )
+        if file_hash and self._state_index is not None:
+            self._state_index[rel_path] = dict(state or {}, file_path=rel_path, file_hash=file_hash,
+                                               modified_time=file_stat.st_mtime, file_size=file_stat.st_size,
+                                               inode=file_stat.st_ino)
+        return file_hash
     
-    def _need_upload(self, local_file_path: str, drive_file_id: str, config_id: int, rel_path: str) -> bool:
+    def _need_upload(self, local_file_path: str, drive_file_info: Dict[str, Any], config_id: int, rel_path: str,
+                   local_stat: Optional[os.stat_result] = None) -> bool:
         """
         Проверка, нужно ли загружать/обновлять файл
         
         Args:
             local_file_path (str): Путь к локальному файлу
-            drive_file_id (str): ID файла в Google Drive
+            drive_file_info (Dict[str, Any]): Информация о файле из _get_drive_files
             config_id (int): ID конфигурации в базе данных
             rel_path (str): Относительный путь к файлу
+            local_stat (Optional[os.stat_result]): stat локального файла, полученный при обходе папки
             
         Returns:
             bool: True, если файл нужно загрузить/обновить
         """
         try:
-            # Получаем информацию о локальном файле
-            local_stat = os.stat(local_file_path)
+            # Получаем информацию о локальном файле (если она не получена при обходе папки)
+            if local_stat is None:
+                local_stat = os.stat(local_file_path)
             local_size = local_stat.st_size
             local_mtime = local_stat.st_mtime
             
-            # Получаем информацию о файле в Google Drive
-            drive_file_info = self.service.files().get(
-                fileId=drive_file_id,
-                fields='id, name, modifiedTime, size'
-            ).execute()
-            
-            drive_size = int(drive_file_info.get('size', 0))
-            drive_modified_time = drive_file_info.get('modifiedTime')
-            
-            # Преобразуем время модификации из Google Drive в timestamp
-            if drive_modified_time:
-                drive_mtime = TimeUtils.parse_iso8601(drive_modified_time)
-            else:
-                drive_mtime = 0
-            
-            # Сравниваем размеры
-            if local_size != drive_size:
+            # Сравниваем размеры: самая дешевая проверка, без хеширования и обращения к базе
+            if local_size != drive_file_info['size']:
                 return True
             
+            # Для двоичных файлов Drive отдает MD5, по нему сравниваем содержимое
+            drive_md5 = drive_file_info.get('md5_checksum')
+            if drive_md5:
+                return self._get_local_md5(config_id, rel_path, local_file_path, local_stat) != drive_md5
+            
             # Сравниваем время модификации
+            drive_mtime = drive_file_info['modified_time_epoch']
             if local_mtime > drive_mtime:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            state = self._get_file_state(config_id, rel_path)
+            # Если время модификации в базе отличается от текущего, нужно обновить
+            if state and abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
+                return True
             
             return False
             
@@ -666,56 +1240,47 @@ class GoogleDriveSyncManager:
             logger.error(f"Ошибка при проверке необходимости загрузки файла {local_file_path}: {e}")
             return True  # В случае ошибки, считаем что файл нужно обновить
     
-    def _need_download(self, drive_file_id: str, local_file_path: str, config_id: int, rel_path: str) -> bool:
+    def _need_download(self, drive_file_info: Dict[str, Any], local_file_path: str, config_id: int, rel_path: str,
+                     local_stat: Optional[os.stat_result] = None) -> bool:
         """
         Проверка, нужно ли скачивать/обновлять файл
         
         Args:
-            drive_file_id (str): ID файла в Google Drive
+            drive_file_info (Dict[str, Any]): Информация о файле из _get_drive_files
             local_file_path (str): Путь к локальному файлу
             config_id (int): ID конфигурации в базе данных
             rel_path (str): Относительный путь к файлу
+            local_stat (Optional[os.stat_result]): stat локального файла, полученный при обходе папки
             
         Returns:
             bool: True, если файл нужно скачать/обновить
         """
         try:
-            # Получаем информацию о локальном файле
-            local_stat = os.stat(local_file_path)
+            # Получаем информацию о локальном файле (если она не получена при обходе папки)
+            if local_stat is None:
+                local_stat = os.stat(local_file_path)
             local_size = local_stat.st_size
             local_mtime = local_stat.st_mtime
             
-            # Получаем информацию о файле в Google Drive
-            drive_file_info = self.service.files().get(
-                fileId=drive_file_id,
-                fields='id, name, modifiedTime, size'
-            ).execute()
-            
-            drive_size = int(drive_file_info.get('size', 0))
-            drive_modified_time = drive_file_info.get('modifiedTime')
-            
-            # Преобразуем время модификации из Google Drive в timestamp
-            if drive_modified_time:
-                drive_mtime = TimeUtils.parse_iso8601(drive_modified_time)
-            else:
-                drive_mtime = 0
-            
-            # Сравниваем размеры
-            if local_size != drive_size:
+            # Сравниваем размеры: самая дешевая проверка, без хеширования и обращения к базе
+            if local_size != drive_file_info['size']:
                 return True
             
+            # Для двоичных файлов Drive отдает MD5, по нему сравниваем содержимое
+            drive_md5 = drive_file_info.get('md5_checksum')
+            if drive_md5:
+                return self._get_local_md5(config_id, rel_path, local_file_path, local_stat) != drive_md5
+            
             # Сравниваем время модификации
+            drive_mtime = drive_file_info['modified_time_epoch']
             if local_mtime < drive_mtime:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            state = self._get_file_state(config_id, rel_path)
+            # Если время модификации в базе отличается от текущего, нужно обновить
+            if state and abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
+                return True
             
             return False
             
@@ -739,17 +1304,22 @@ class GoogleDriveSyncManager:
         Returns:
             bool: True, если загрузка успешна
         """
+        service = self._get_service()
+        
         try:
-            media = MediaFileUpload(local_file_path, resumable=True)
+            # Небольшие файлы загружаем одним запросом: сессия возобновления стоит лишнего обращения
+            resumable = os.path.getsize(local_file_path) > DRIVE_RESUMABLE_THRESHOLD
+            media = MediaFileUpload(local_file_path, chunksize=self.upload_chunk_size, resumable=resumable)
             
             if file_id:
                 # Обновляем существующий файл
                 file_metadata = {'name': drive_file_name}
-                file = self.service.files().update(
+                file = self._execute_with_retry(service.files().update(
                     fileId=file_id,
                     body=file_metadata,
-                    media_body=media
-                ).execute()
+                    media_body=media,
+                    fields='id'
+                ))
                 
                 info_msg = f"Обновлен файл в Google Drive: {drive_file_name}"
                 logger.info(info_msg)
@@ -762,17 +1332,18 @@ class GoogleDriveSyncManager:
                     'parents': [parent_id]
                 }
                 
-                file = self.service.files().create(
+                file = self._execute_with_retry(service.files().create(
                     body=file_metadata,
                     media_body=media,
                     fields='id'
-                ).execute()
+                ))
                 
                 info_msg = f"Загружен файл в Google Drive: {drive_file_name}"
                 logger.info(info_msg)
                 if callback:
                     callback(info_msg, "info")
             
+            self.invalidate_drive_listing()
             return True
             
         except Exception as e:
@@ -781,11 +1352,12 @@ class GoogleDriveSyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
     def _download_file(self, file_id: str, local_file_path: str, 
-                      callback: Optional[Callable[[str, str], None]] = None) -> bool:
+                      callback: Optional[Callable[[str, str], None]] = None,
+                      drive_file_info: Optional[Dict[str, Any]] = None) -> bool:
         """
         Скачивание файла из Google Drive
         
@@ -793,50 +1365,66 @@ class GoogleDriveSyncManager:
             file_id (str): ID файла в Google Drive
             local_file_path (str): Путь для сохранения файла
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            drive_file_info (Optional[Dict[str, Any]]): Информация о файле из _get_drive_files;
+                если не передана, запрашивается у Drive API
             
         Returns:
             bool: True, если скачивание успешно
         """
+        service = self._get_service()
+        
         try:
-            # Получаем информацию о файле
-            file_info = self.service.files().get(
-                fileId=file_id,
-                fields='id, name, mimeType'
-            ).execute()
-            
-            file_name = file_info.get('name', 'Unknown')
-            mime_type = file_info.get('mimeType')
+            if drive_file_info is not None:
+                file_name = drive_file_info['name']
+                mime_type = drive_file_info['mime_type']
+            else:
+                # Получаем информацию о файле
+                file_info = self._execute_with_retry(service.files().get(
+                    fileId=file_id,
+                    fields='name, mimeType'
+                ))
+                
+                file_name = file_info.get('name', 'Unknown')
+                mime_type = file_info.get('mimeType')
             
             # Создаем директорию для сохранения файла, если она не существует
             output_dir = os.path.dirname(local_file_path)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
             
             # Если это Google Docs, Sheets и т.д., экспортируем в соответствующий формат
-            if mime_type == 'application/vnd.google-apps.document':
-                request = self.service.files().export_media(fileId=file_id, mimeType='application/pdf')
-                local_file_path += '.pdf'
-            elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                request = self.service.files().export_media(fileId=file_id, mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                local_file_path += '.xlsx'
-            elif mime_type == 'application/vnd.google-apps.presentation':
-                request = self.service.files().export_media(fileId=file_id, mimeType='application/vnd.openxmlformats-officedocument.presentationml.presentation')
-                local_file_path += '.pptx'
+            export_format = EXPORT_MAP.get(mime_type)
+            if export_format:
+                export_mime_type, extension = export_format
+                request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
+                local_file_path += extension
             else:
                 # Для обычных файлов просто скачиваем
-                request = self.service.files().get_media(fileId=file_id)
-            
-            # Скачиваем файл
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            
-            while not done:
-                status, done = downloader.next_chunk()
+                request = service.files().get_media(fileId=file_id)
             
-            # Сохраняем файл на диск
-            with open(local_file_path, 'wb') as f:
-                f.write(fh.getvalue())
+            # Скачиваем файл сразу на диск во временный файл, чтобы прерванное
+            # скачивание не оставило на месте целевого файла обрезанную копию
+            partial_path = local_file_path + DRIVE_PARTIAL_SUFFIX
+            try:
+                with open(partial_path, 'wb', buffering=DRIVE_WRITE_BUFFER_SIZE) as fh:
+                    downloader = MediaIoBaseDownload(fh, request, chunksize=self.download_chunk_size)
+                    done = False
+                    
+                    while not done:
+                        status, done = downloader.next_chunk(num_retries=DRIVE_MAX_RETRIES)
+                    
+                    # Большие файлы при пакетном скачивании вытесняют из кэша полезные данные
+                    if hasattr(os, 'posix_fadvise') and fh.tell() >= DRIVE_FADVISE_THRESHOLD:
+                        fh.flush()
+                        os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                
+                os.replace(partial_path, local_file_path)
+            except BaseException:
+                try:
+                    os.unlink(partial_path)
+                except OSError:
+                    pass
+                raise
             
             info_msg = f"Скачан файл из Google Drive: {file_name}"
             logger.info(info_msg)
@@ -851,31 +1439,41 @@ class GoogleDriveSyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
-    def _delete_file(self, file_id: str, callback: Optional[Callable[[str, str], None]] = None) -> bool:
+    def _delete_file(self, file_id: str, file_name: Optional[str] = None,
+                     callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
         Удаление файла из Google Drive
         
         Args:
             file_id (str): ID файла в Google Drive
+            file_name (Optional[str]): Имя файла для сообщений; если не указано,
+                запрашивается у Drive API перед удалением
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
             
         Returns:
             bool: True, если удаление успешно
         """
+        service = self._get_service()
+        
         try:
-            # Получаем информацию о файле перед удалением
-            file_info = self.service.files().get(
-                fileId=file_id,
-                fields='id, name'
-            ).execute()
-            
-            file_name = file_info.get('name', 'Unknown')
+            if file_name is None:
+                # Получаем информацию о файле перед удалением
+                file_info = self._execute_with_retry(service.files().get(
+                    fileId=file_id,
+                    fields='name'
+                ))
+                
+                file_name = file_info.get('name', 'Unknown')
             
             # Удаляем файл
-            self.service.files().delete(fileId=file_id).execute()
+            self._execute_with_retry(service.files().delete(fileId=file_id))
+            
+            # Снимок обновляем сразу, не дожидаясь следующего запроса изменений
+            self._forget_drive_entry(file_id)
+            self.invalidate_drive_listing()
             
             info_msg = f"Удален файл из Google Drive: {file_name} (ID: {file_id})"
             logger.info(info_msg)
@@ -890,9 +1488,67 @@ class GoogleDriveSyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
+    def _delete_files_batch(self, config_id: int, deletions: List[Tuple[str, str, str]],
+                            callback: Optional[Callable[[str, str], None]] = None):
+        """
+        Пакетное удаление файлов из Google Drive
+        
+        Запросы files().delete объединяются по DRIVE_BATCH_SIZE в один HTTP-запрос,
+        имена файлов берутся из списка, поэтому предварительный files().get не нужен.
+        Состояния удаленных файлов удаляются из базы одной транзакцией на пакет.
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            deletions (List[Tuple[str, str, str]]): Список (ID файла, имя файла, относительный путь)
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+        """
+        by_id = {file_id: (file_name, rel_path) for file_id, file_name, rel_path in deletions}
+        deleted_paths = []
+        
+        def _on_response(request_id, response, exception):
+            file_name, rel_path = by_id[request_id]
+            
+            if exception is not None:
+                error_msg = f"Ошибка при удалении файла {request_id} из Google Drive: {exception}"
+                logger.error(error_msg)
+                if callback:
+                    callback(error_msg, "error")
+                self._increment_stat('errors')
+                return
+            
+            info_msg = f"Удален файл из Google Drive: {file_name} (ID: {request_id})"
+            logger.info(info_msg)
+            if callback:
+                callback(info_msg, "info")
+            
+            self._increment_stat('deleted')
+            self._forget_drive_entry(request_id)
+            self.invalidate_drive_listing()
+            deleted_paths.append(rel_path)
+        
+        file_ids = list(by_id)
+        for start in range(0, len(file_ids), DRIVE_BATCH_SIZE):
+            chunk = file_ids[start:start + DRIVE_BATCH_SIZE]
+            try:
+                batch = self.service.new_batch_http_request(callback=_on_response)
+                for file_id in chunk:
+                    batch.add(self.service.files().delete(fileId=file_id), request_id=file_id)
+                self._execute_with_retry(batch)
+            except Exception as e:
+                error_msg = f"Ошибка при пакетном удалении файлов из Google Drive: {e}"
+                logger.error(error_msg)
+                if callback:
+                    callback(error_msg, "error")
+                self._increment_stat('errors', len(chunk))
+            
+            # Удаляем состояния файлов из базы данных
+            if deleted_paths:
+                self.db_manager.delete_file_states(config_id, deleted_paths)
+                deleted_paths.clear()
+    
     def _delete_local_file(self, file_path: str, callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
         Удаление локального файла
@@ -925,28 +1581,44 @@ class GoogleDriveSyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
-    def _update_file_state_in_db(self, config_id: int, rel_path: str, file_path: str, sync_status: str):
+    def _update_file_state_in_db(self, config_id: int, rel_path: str, file_path: str, sync_status: str,
+                                 file_stat: Optional[os.stat_result] = None, file_hash: Optional[str] = None):
         """
         Обновление состояния файла в базе данных
         
+        Если MD5 не передан, сохраняется ранее вычисленный, пока inode, размер и время
+        модификации файла не изменились; иначе он будет вычислен лениво при сравнении с Drive.
+        
         Args:
             config_id (int): ID конфигурации
             rel_path (str): Относительный путь к файлу
             file_path (str): Полный путь к файлу
             sync_status (str): Статус синхронизации
+            file_stat (Optional[os.stat_result]): stat файла, если уже получен при обходе папки
+            file_hash (Optional[str]): MD5 содержимого файла, если известен
         """
         try:
-            file_stat = os.stat(file_path)
+            if file_stat is None:
+                file_stat = os.stat(file_path)
+            
+            if file_hash is None:
+                state = self._get_file_state(config_id, rel_path)
+                if (state and state.get('inode') == file_stat.st_ino
+                        and state.get('file_size') == file_stat.st_size
+                        and state.get('modified_time') == file_stat.st_mtime):
+                    file_hash = state.get('file_hash')
             
             self.db_manager.update_file_state(
                 config_id=config_id,
                 file_path=rel_path,
-                file_hash=None,  # Для Google Drive не используем хеш
+                file_hash=file_hash,
                 modified_time=file_stat.st_mtime,
-                sync_status=sync_status
+                sync_status=sync_status,
+                file_size=file_stat.st_size,
+                inode=file_stat.st_ino
             )
         except Exception as e:
             logger.error(f"Ошибка при обновлении состояния файла в базе данных: {e}")
@@ -962,38 +1634,49 @@ class GoogleDriveSyncManager:
             direction (str): Направление синхронизации ('upload' или 'download')
         """
         try:
+            state_index = self._load_state_index(config_id)
+            
+            # Строки для bulk_update_file_states: (file_path, file_hash, modified_time, sync_status, file_size, inode);
+            # ранее вычисленный MD5 сохраняется, если файл не изменился, иначе вычисляется лениво при сравнении с Drive
+            rows = []
+            
+            def _state_row(rel_path: str, file_stat: os.stat_result) -> tuple:
+                state = state_index.get(rel_path)
+                file_hash = None
+                if (state and state.get('inode') == file_stat.st_ino
+                        and state.get('file_size') == file_stat.st_size
+                        and state.get('modified_time') == file_stat.st_mtime):
+                    file_hash = state.get('file_hash')
+                return (rel_path, file_hash, file_stat.st_mtime, 'synced', file_stat.st_size, file_stat.st_ino)
+            
             if direction == 'upload':
                 # Обновляем состояния на основе локальных файлов
-                for root, dirs, files in os.walk(source_path):
-                    for filename in files:
-                        local_file_path = os.path.join(root, filename)
-                        rel_path = os.path.relpath(local_file_path, source_path)
-                        
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+                for local_file_path, rel_path, file_stat in self._scan_local_files(source_path):
+                    rows.append(_state_row(rel_path, file_stat))
                 
-                # Удаляем из базы данных записи о файлах, которых больше нет локально
-                file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    local_file_path = os.path.join(source_path, state['file_path'])
-                    if not os.path.exists(local_file_path):
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+                present_paths = {row[0] for row in rows}
             
             elif direction == 'download':
                 # Обновляем состояния на основе файлов в Google Drive
-                drive_files = self._get_drive_files(target_folder_id)
+                drive_files = self._get_drive_files_cached(target_folder_id, config_id)
                 
                 for file_id, file_info in drive_files.items():
                     rel_path = file_info['rel_path']
-                    local_file_path = os.path.join(source_path, rel_path)
-                    
-                    if os.path.exists(local_file_path):
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+                    try:
+                        file_stat = os.stat(os.path.join(source_path, rel_path))
+                    except OSError:
+                        continue
+                    rows.append(_state_row(rel_path, file_stat))
                 
-                # Удаляем из базы данных записи о файлах, которых больше нет в Google Drive
-                file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    if state['file_path'] not in {info['rel_path'] for info in drive_files.values()}:
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+                present_paths = {info['rel_path'] for info in drive_files.values()}
+            
+            else:
+                return
+            
+            # Записываем состояния и удаляем записи о файлах, которых больше нет, одной транзакцией каждое
+            self.db_manager.bulk_update_file_states(config_id, rows)
+            self.db_manager.delete_file_states(config_id, [file_path for file_path in state_index
+                                                           if file_path not in present_paths])
             
             logger.info(f"Обновлены состояния файлов для конфигурации {config_id}")
             
@@ -1041,6 +1724,13 @@ class GoogleDriveSyncManager:
             'errors': []
         }
         
+        # Состояния файлов загружаем один раз на весь предпросмотр
+        previous_state_index = self._state_index
+        previous_persist_md5_cache = self._persist_md5_cache
+        self._state_index = self._load_state_index(config_id)
+        # Предпросмотр не меняет file_states: вычисленные MD5 остаются только в индексе
+        self._persist_md5_cache = False
+        
         try:
             if direction == 'upload':
                 # Предпросмотр загрузки в Google Drive
@@ -1049,17 +1739,16 @@ class GoogleDriveSyncManager:
                     return preview
                 
                 # Получаем списки файлов
-                local_files = self._get_local_files(source_path)
-                drive_files = self._get_drive_files(target_folder_id)
+                drive_files, local_files = self._get_file_lists(target_folder_id, source_path, config_id)
+                
+                # Индекс файлов Google Drive по относительному пути (при дубликатах берется первый)
+                matches = {}
+                for fid, drive_file_info in drive_files.items():
+                    matches.setdefault(drive_file_info['rel_path'], fid)
                 
                 # Файлы для загрузки
                 for rel_path, file_info in local_files.items():
-                    # Ищем файл в Google Drive
-                    file_id = None
-                    for fid, drive_file_info in drive_files.items():
-                        if drive_file_info['name'] == os.path.basename(rel_path):
-                            file_id = fid
-                            break
+                    file_id = matches.get(rel_path)
                     
                     if not file_id:
                         # Файла нет в Google Drive, загружаем
@@ -1070,7 +1759,8 @@ class GoogleDriveSyncManager:
                         })
                     else:
                         # Файл есть в Google Drive, проверяем, нужно ли обновлять
-                        if self._need_upload(os.path.join(source_path, rel_path), file_id, config_id, rel_path):
+                        if self._need_upload(os.path.join(source_path, rel_path), drive_files[file_id], config_id, rel_path,
+                                             file_info.get('stat')):
                             preview['to_update'].append({
                                 'path': rel_path,
                                 'size': file_info['size'],
@@ -1086,51 +1776,47 @@ class GoogleDriveSyncManager:
                 # Файлы для удаления
                 for file_id, file_info in drive_files.items():
                     rel_path = file_info['rel_path']
-                    local_file_path = os.path.join(source_path, rel_path)
                     
-                    if not os.path.exists(local_file_path):
+                    if rel_path not in local_files and not os.path.exists(os.path.join(source_path, rel_path)):
                         preview['to_delete'].append({
                             'path': rel_path,
-                            'size': int(file_info['size'] or 0),
-                            'mtime': TimeUtils.parse_iso8601(file_info['modified_time']) if file_info['modified_time'] else 0
+                            'size': file_info['size'],
+                            'mtime': file_info['modified_time_epoch']
                         })
             
             elif direction == 'download':
                 # Предпросмотр скачивания из Google Drive
-                # Получаем списки файлов
-                local_files = self._get_local_files(source_path) if os.path.exists(source_path) else {}
-                drive_files = self._get_drive_files(target_folder_id)
+                # Получаем списки файлов; метаданные Drive берутся из списка, без запросов по каждому файлу
+                if os.path.exists(source_path):
+                    drive_files, local_files = self._get_file_lists(target_folder_id, source_path, config_id)
+                else:
+                    drive_files, local_files = self._get_drive_files_cached(target_folder_id, config_id), {}
                 
                 # Файлы для скачивания
                 for file_id, file_info in drive_files.items():
                     rel_path = file_info['rel_path']
+                    local_info = local_files.get(rel_path)
                     
-                    if rel_path not in local_files:
-                        # Файла нет локально, скачиваем
-                        preview['to_download'].append({
+                    if local_info is not None and not self._need_download(
+                            file_info, os.path.join(source_path, rel_path), config_id, rel_path, local_info.get('stat')):
+                        # Файл есть локально и не изменился
+                        preview['to_skip'].append({
                             'path': rel_path,
-                            'size': int(file_info['size'] or 0),
-                            'mtime': TimeUtils.parse_iso8601(file_info['modified_time']) if file_info['modified_time'] else 0
+                            'size': local_info['size'],
+                            'mtime': local_info['mtime']
                         })
                     else:
-                        # Файл есть локально, проверяем, нужно ли обновлять
-                        local_file_path = os.path.join(source_path, rel_path)
-                        if self._need_download(file_id, local_file_path, config_id, rel_path):
-                            preview['to_download'].append({
-                                'path': rel_path,
-                                'size': int(file_info['size'] or 0),
-                                'mtime': TimeUtils.parse_iso8601(file_info['modified_time']) if file_info['modified_time'] else 0
-                            })
-                        else:
-                            preview['to_skip'].append({
-                                'path': rel_path,
-                                'size': local_files[rel_path]['size'],
-                                'mtime': local_files[rel_path]['mtime']
-                            })
+                        # Файла нет локально или он изменился, скачиваем
+                        preview['to_download'].append({
+                            'path': rel_path,
+                            'size': file_info['size'],
+                            'mtime': file_info['modified_time_epoch']
+                        })
                 
                 # Файлы для удаления
+                drive_rel_paths = {info['rel_path'] for info in drive_files.values()}
                 for rel_path in local_files:
-                    if rel_path not in {info['rel_path'] for info in drive_files.values()}:
+                    if rel_path not in drive_rel_paths:
                         preview['to_delete'].append({
                             'path': rel_path,
                             'size': local_files[rel_path]['size'],
@@ -1142,5 +1828,9 @@ class GoogleDriveSyncManager:
         except Exception as e:
             preview['errors'].append(f"Ошибка при предварительном просмотре синхронизации: {e}")
             return preview
+        
+        finally:
+            self._state_index = previous_state_index
+            self._persist_md5_cache = previous_persist_md5_cache
 
 GoogleDriveSync = GoogleDriveSyncManager
@@ -1,16 +1,103 @@
 import os
+import errno
 import shutil
 import hashlib
+import mmap
 import time
 from datetime import datetime
 import logging
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Callable, Any, Union
+from typing import Dict, List, Tuple, Optional, Callable, Any, Union, Iterator
 
 from src.sync.utils import FileUtils, TimeUtils, CryptoUtils
 
 logger = logging.getLogger(__name__)
 
+# Алгоритм хеширования содержимого файлов (SHA-256 ускоряется аппаратно на современных CPU, MD5 - нет)
+LOCAL_HASH_ALGORITHM = "sha256"
+# Количество потоков для параллельного хеширования файлов (на HDD имеет смысл 1)
+LOCAL_HASH_WORKERS = min(8, os.cpu_count() or 1)
+# Допустимое расхождение времени модификации, секунды (FAT хранит время с точностью до 2 секунд)
+LOCAL_MTIME_TOLERANCE = 2.0
+# Размер файла, начиная с которого хеш считается через mmap, байты
+LOCAL_MMAP_HASH_THRESHOLD = 16 * 1024 * 1024
+# Размер блока, передаваемого в hashlib при хешировании через mmap, байты
+LOCAL_MMAP_HASH_CHUNK = 1024 * 1024
+# Количество записей журнала операций, накапливаемых перед записью в базу одной транзакцией
+LOCAL_DB_BATCH_SIZE = 1000
+# Количество проверок файлов, выполняемых с опережением основного цикла синхронизации
+LOCAL_PIPELINE_DEPTH = 64
+
+
+class FolderIndex:
+    """
+    Список файлов папки в виде параллельных массивов
+    
+    Размеры и времена модификации хранятся в array.array (8 байт на значение)
+    вместо словаря метаданных на каждый файл, что на больших деревьях
+    сокращает расход памяти в разы.
+    """
+    
+    __slots__ = ('paths', 'sizes', 'mtimes', 'positions')
+    
+    def __init__(self):
+        self.paths: List[str] = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        # Относительный путь -> позиция файла в массивах
+        self.positions: Dict[str, int] = {}
+    
+    def add(self, rel_path: str, size: int, mtime: float):
+        """
+        Добавление файла в индекс
+        
+        Args:
+            rel_path (str): Относительный путь к файлу
+            size (int): Размер файла
+            mtime (float): Время модификации файла
+        """
+        self.positions[rel_path] = len(self.paths)
+        self.paths.append(rel_path)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+    
+    def find(self, rel_path: str) -> Optional[int]:
+        """
+        Поиск позиции файла в индексе
+        
+        Args:
+            rel_path (str): Относительный путь к файлу
+            
+        Returns:
+            Optional[int]: Позиция файла или None, если файла нет
+        """
+        return self.positions.get(rel_path)
+    
+    def meta(self, position: int) -> Tuple[int, float]:
+        """
+        Размер и время модификации файла
+        
+        Args:
+            position (int): Позиция файла в индексе
+            
+        Returns:
+            Tuple[int, float]: Размер и время модификации
+        """
+        return self.sizes[position], self.mtimes[position]
+    
+    def __contains__(self, rel_path: str) -> bool:
+        return rel_path in self.positions
+    
+    def __iter__(self):
+        return iter(self.paths)
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
 class LocalSyncManager:
     """Менеджер синхронизации локальных папок"""
     
@@ -31,23 +118,112 @@ class LocalSyncManager:
             'errors': 0
         }
         self.current_sync_id = None
+        self.io_parallelism = LOCAL_HASH_WORKERS
+        # Кэш хешей в пределах одной синхронизации: (путь, размер, mtime) -> хеш
+        self._hash_cache: Dict[Tuple[str, int, float], str] = {}
+        # Полная проверка содержимого; при False файлы одинакового размера сравниваются по выборке
+        self.strict_hash = False
     
     def calculate_file_hash(self, file_path: str) -> Optional[str]:
         """
         Вычисление хеша файла для сравнения
         
+        Хеш возвращается с префиксом алгоритма ("sha256:..."), чтобы сохраненные
+        в базе хеши другого алгоритма (ранее MD5 без префикса) не считались изменением.
+        Результат кэшируется по пути, размеру и времени модификации файла.
+        
         Args:
             file_path (str): Путь к файлу
             
         Returns:
             Optional[str]: Хеш файла или None в случае ошибки
         """
-        return FileUtils.get_file_hash(file_path, "md5")
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logger.error(f"Ошибка при получении информации о файле {file_path}: {e}")
+            return None
+        
+        cache_key = (file_path, stat.st_size, stat.st_mtime)
+        cached_hash = self._hash_cache.get(cache_key)
+        if cached_hash:
+            return cached_hash
+        
+        file_hash = None
+        if stat.st_size > LOCAL_MMAP_HASH_THRESHOLD:
+            try:
+                file_hash = self._hash_large_file(file_path)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Хеширование через mmap недоступно для {file_path}: {e}")
+        
+        if not file_hash:
+            file_hash = FileUtils.get_file_hash(file_path, LOCAL_HASH_ALGORITHM)
+        if not file_hash:
+            return None
+        
+        file_hash = f"{LOCAL_HASH_ALGORITHM}:{file_hash}"
+        self._hash_cache[cache_key] = file_hash
+        return file_hash
+    
+    def _hash_large_file(self, file_path: str) -> str:
+        """
+        Вычисление хеша большого файла через mmap
+        
+        Данные передаются в hashlib срезами memoryview без копирования в Python-буфер.
+        Ядру сообщается о последовательном чтении, а после хеширования страницы
+        файла вытесняются из кэша, чтобы проверка не вытесняла полезные данные.
+        
+        Args:
+            file_path (str): Путь к файлу
+            
+        Returns:
+            str: Хеш файла в шестнадцатеричном виде
+        """
+        hasher = hashlib.new(LOCAL_HASH_ALGORITHM)
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as view:
+                    for offset in range(0, len(view), LOCAL_MMAP_HASH_CHUNK):
+                        hasher.update(view[offset:offset + LOCAL_MMAP_HASH_CHUNK])
+            
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        
+        return hasher.hexdigest()
+    
+    def _hash_files(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Вычисление хешей набора файлов
+        
+        hashlib освобождает GIL при хешировании, поэтому независимые файлы
+        хешируются параллельно в io_parallelism потоках.
+        
+        Args:
+            file_paths (List[str]): Пути к файлам
+            
+        Returns:
+            Dict[str, Optional[str]]: Хеши файлов по путям
+        """
+        workers = max(1, min(self.io_parallelism, len(file_paths)))
+        if workers == 1:
+            return {file_path: self.calculate_file_hash(file_path) for file_path in file_paths}
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(file_paths, executor.map(self.calculate_file_hash, file_paths)))
     
     def sync_folders(self, config_id: int, source_path: str, target_path: str,
                     callback: Optional[Callable[[str, str], None]] = None,
                     delete_mode: bool = True,
-                    history_id: Optional[int] = None) -> Dict[str, int]:
+                    history_id: Optional[int] = None,
+                    strict_hash: bool = False) -> Dict[str, int]:
         """
         Синхронизация папок
         
@@ -57,6 +233,8 @@ class LocalSyncManager:
             target_path (str): Путь к целевой папке
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
             delete_mode (bool): Удалять ли файлы, отсутствующие в источнике
+            history_id (Optional[int]): ID записи истории синхронизации
+            strict_hash (bool): Сравнивать содержимое по полному хешу, а не по выборке
             
         Returns:
             Dict[str, int]: Статистика синхронизации
@@ -69,6 +247,8 @@ class LocalSyncManager:
             'skipped': 0,
             'errors': 0
         }
+        self._hash_cache = {}
+        self.strict_hash = strict_hash
 
         # Используем переданный history_id или создаем новый
         if history_id:
@@ -127,120 +307,128 @@ class LocalSyncManager:
         source_files = self._get_files_list(source_path)
         target_files = self._get_files_list(target_path)
         
+        # Состояния файлов загружаем из базы один раз на всю синхронизацию
+        file_states = self._load_state_index(config_id)
+        
+        # Скопированные файлы; их состояния записываются после цикла, хеши считаются параллельно
+        copied_files = []
+        # Журнал операций записывается в базу пакетами по LOCAL_DB_BATCH_SIZE записей
+        file_operations = []
+        
+        # Пути собираются конкатенацией с готовыми префиксами вместо os.path.join
+        source_prefix = os.path.join(source_path, '')
+        target_prefix = os.path.join(target_path, '')
+        # Подкаталоги целевой папки, которые уже проверены или созданы
+        known_dirs = set()
+        # Отладочные сообщения по каждому файлу формируются только при включенном уровне DEBUG
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        
+        # Проверки необходимости обновления выполняются в фоновых потоках с опережением
+        # основного цикла, пока он копирует предыдущие файлы
+        update_checks = self._iter_update_checks(source_files, target_files,
+                                                 source_prefix, target_prefix, file_states)
+        
         # Синхронизируем файлы из исходной папки в целевую
-        for rel_path in source_files:
-            source_file = os.path.join(source_path, rel_path)
-            target_file = os.path.join(target_path, rel_path)
-            
-            # Создаем подкаталоги, если необходимо
-            target_dir = os.path.dirname(target_file)
-            if not os.path.exists(target_dir):
-                try:
-                    os.makedirs(target_dir)
-                    logger.debug(f"Создан подкаталог: {target_dir}")
-                except Exception as e:
-                    error_msg = f"Ошибка при создании подкаталога {target_dir}: {e}"
-                    logger.error(error_msg)
-                    if callback:
-                        callback(error_msg, "error")
-                    
-                    self.sync_stats['errors'] += 1
-                    continue
+        for position, rel_path in enumerate(source_files.paths):
+            source_file = source_prefix + rel_path
+            target_file = target_prefix + rel_path
             
             # Проверяем, нужно ли копировать/обновлять файл
             if rel_path not in target_files:
+                # Создаем подкаталоги, если необходимо (один раз на каталог)
+                rel_dir = rel_path.rpartition(os.sep)[0]
+                if rel_dir and rel_dir not in known_dirs:
+                    target_dir = target_prefix + rel_dir
+                    try:
+                        if not os.path.isdir(target_dir):
+                            os.makedirs(target_dir, exist_ok=True)
+                            logger.debug(f"Создан подкаталог: {target_dir}")
+                        known_dirs.add(rel_dir)
+                    except Exception as e:
+                        error_msg = f"Ошибка при создании подкаталога {target_dir}: {e}"
+                        logger.error(error_msg)
+                        if callback:
+                            callback(error_msg, "error")
+                        
+                        self.sync_stats['errors'] += 1
+                        continue
+                
                 # Файла нет в целевой папке, копируем
-                if self._copy_file(source_file, target_file, callback):
+                file_size = self._copy_file(source_file, target_file, callback)
+                if file_size is not None:
                     self.sync_stats['copied'] += 1
-
-                    # Обновляем состояние файла в базе данных
-                    self._update_file_state_in_db(config_id, rel_path, source_file, 'synced')
+                    copied_files.append((rel_path, source_file, source_files.meta(position)))
 
                     # Логируем операцию
                     if self.current_sync_id:
-                        try:
-                            file_size = os.path.getsize(source_file) if os.path.exists(source_file) else 0
-                            self.db_manager.add_file_operation(
-                                history_id=self.current_sync_id,
-                                operation_type='copied',
-                                file_path=rel_path,
-                                source_path=source_file,
-                                target_path=target_file,
-                                file_size=file_size,
-                                status='success'
-                            )
-                        except Exception as e:
-                            logger.error(f"Ошибка при логировании операции копирования: {e}")
+                        self._log_file_operation(file_operations, 'copied', rel_path,
+                                                 source_file, target_file, file_size)
             else:
-                # Файл есть в обеих папках, проверяем, нужно ли обновлять
-                if self._need_update(source_file, target_file, config_id, rel_path):
-                    if self._copy_file(source_file, target_file, callback):
+                # Файл есть в обеих папках (значит, и его каталог); результат проверки
+                # берется из конвейера в том же порядке, в котором идут файлы
+                if next(update_checks):
+                    file_size = self._copy_file(source_file, target_file, callback)
+                    if file_size is not None:
                         self.sync_stats['updated'] += 1
-
-                        # Обновляем состояние файла в базе данных
-                        self._update_file_state_in_db(config_id, rel_path, source_file, 'synced')
+                        copied_files.append((rel_path, source_file, source_files.meta(position)))
 
                         # Логируем операцию
                         if self.current_sync_id:
-                            try:
-                                file_size = os.path.getsize(source_file) if os.path.exists(source_file) else 0
-                                self.db_manager.add_file_operation(
-                                    history_id=self.current_sync_id,
-                                    operation_type='updated',
-                                    file_path=rel_path,
-                                    source_path=source_file,
-                                    target_path=target_file,
-                                    file_size=file_size,
-                                    status='success'
-                                )
-                            except Exception as e:
-                                logger.error(f"Ошибка при логировании операции обновления: {e}")
+                            self._log_file_operation(file_operations, 'updated', rel_path,
+                                                     source_file, target_file, file_size)
                 else:
                     self.sync_stats['skipped'] += 1
-                    debug_msg = f"Файл пропущен (без изменений): {rel_path}"
-                    logger.debug(debug_msg)
-                    if callback:
-                        callback(debug_msg, "debug")
+                    if debug_enabled:
+                        debug_msg = f"Файл пропущен (без изменений): {rel_path}"
+                        logger.debug(debug_msg)
+                        if callback:
+                            callback(debug_msg, "debug")
+        
+        # Обновляем состояния скопированных файлов в базе данных
+        file_hashes = self._hash_files([source_file for _, source_file, _ in copied_files])
+        self._write_file_states(config_id, [
+            (rel_path, source_file, file_hashes[source_file], file_meta)
+            for rel_path, source_file, file_meta in copied_files
+        ])
         
         # Удаляем файлы, которые есть в целевой папке, но отсутствуют в исходной
         # ВАЖНО: удаляем только те файлы, которые система сама синхронизировала (есть в file_states)
         if delete_mode:
-            # Получаем список файлов, которые были синхронизированы системой
-            synced_files = set()
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                synced_files.add(state['file_path'])
-
-            for rel_path in target_files:
-                if rel_path not in source_files:
-                    # Удаляем только если этот файл был синхронизирован системой
-                    if rel_path in synced_files:
-                        target_file = os.path.join(target_path, rel_path)
-                        if self._delete_file(target_file, callback):
-                            self.sync_stats['deleted'] += 1
-
-                            # Удаляем состояние файла из базы данных
-                            self.db_manager.delete_file_state(config_id, rel_path)
-
-                            # Логируем операцию
-                            if self.current_sync_id:
-                                try:
-                                    self.db_manager.add_file_operation(
-                                        history_id=self.current_sync_id,
-                                        operation_type='deleted',
-                                        file_path=rel_path,
-                                        source_path=None,
-                                        target_path=target_file,
-                                        file_size=0,
-                                        status='success'
-                                    )
-                                except Exception as e:
-                                    logger.error(f"Ошибка при логировании операции удаления: {e}")
-                    else:
-                        # Файл не был синхронизирован системой, пропускаем
-                        logger.debug(f"Пропущен файл {rel_path} - не был синхронизирован этой системой")
-                        if callback:
-                            callback(f"Пропущен файл (не синхронизирован системой): {rel_path}", "debug")
+            # Файлы, которые были синхронизированы системой
+            synced_files = file_states.keys()
+            deleted_files = []
+            
+            # Разности множеств путей вычисляются на C-уровне
+            missing_in_source = target_files.positions.keys() - source_files.positions.keys()
+            
+            # Удаляем только файлы, которые были синхронизированы системой
+            for rel_path in missing_in_source & synced_files:
+                target_file = target_prefix + rel_path
+                if self._delete_file(target_file, callback):
+                    self.sync_stats['deleted'] += 1
+                    
+                    # Состояние файла удаляется из базы после цикла
+                    deleted_files.append(rel_path)
+                    
+                    # Логируем операцию
+                    if self.current_sync_id:
+                        self._log_file_operation(file_operations, 'deleted', rel_path,
+                                                 None, target_file, 0)
+            
+            # Файлы, не синхронизированные системой, пропускаем
+            if debug_enabled:
+                for rel_path in missing_in_source - synced_files:
+                    logger.debug(f"Пропущен файл {rel_path} - не был синхронизирован этой системой")
+                    if callback:
+                        callback(f"Пропущен файл (не синхронизирован системой): {rel_path}", "debug")
+            
+            if deleted_files:
+                try:
+                    self.db_manager.delete_file_states(config_id, deleted_files)
+                except Exception as e:
+                    logger.error(f"Ошибка при удалении состояний файлов из базы данных: {e}")
+        
+        self._flush_file_operations(file_operations)
         
         # Обновление истории синхронизации
         if self.current_sync_id:
@@ -269,69 +457,188 @@ class LocalSyncManager:
         
         return self.sync_stats
     
-    def _get_files_list(self, folder_path: str) -> Dict[str, Dict[str, Any]]:
+    def _get_files_list(self, folder_path: str) -> FolderIndex:
         """
         Получение списка всех файлов в папке и подпапках
         
+        Обход выполняется через os.scandir: данные stat берутся из DirEntry,
+        поэтому повторный os.stat для каждого файла не нужен. Подпапки верхнего
+        уровня обходятся параллельно в io_parallelism потоках.
+        
         Args:
             folder_path (str): Путь к папке
             
         Returns:
-            Dict[str, Dict[str, Any]]: Словарь с относительными путями к файлам и их метаданными
+            FolderIndex: Относительные пути файлов, их размеры и времена модификации
         """
-        files = {}
+        files = FolderIndex()
+        prefix_len = len(os.path.join(folder_path, ''))
+        
+        subdirs = []
+        for rel_path, stat in self._scan_directory(folder_path, prefix_len, subdirs):
+            files.add(rel_path, stat.st_size, stat.st_mtime)
+        
+        if not subdirs:
+            return files
+        
+        workers = max(1, min(self.io_parallelism, len(subdirs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for subtree in executor.map(lambda subdir: self._scan_tree(subdir, prefix_len), subdirs):
+                for rel_path, stat in subtree:
+                    files.add(rel_path, stat.st_size, stat.st_mtime)
         
-        for root, dirs, filenames in os.walk(folder_path):
-            # Пропускаем скрытые папки
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
+        return files
+    
+    def _scan_tree(self, folder_path: str, prefix_len: int) -> List[Tuple[str, os.stat_result]]:
+        """
+        Рекурсивный обход папки без рекурсии Python (через стек)
+        
+        Args:
+            folder_path (str): Путь к папке
+            prefix_len (int): Длина префикса корневой папки в путях
             
-            for filename in filenames:
-                # Пропускаем скрытые файлы
-                if filename.startswith('.'):
-                    continue
+        Returns:
+            List[Tuple[str, os.stat_result]]: Относительные пути файлов и их stat
+        """
+        result = []
+        pending_dirs = [folder_path]
+        while pending_dirs:
+            result.extend(self._scan_directory(pending_dirs.pop(), prefix_len, pending_dirs))
+        return result
+    
+    def _scan_directory(self, folder_path: str, prefix_len: int,
+                        subdirs: List[str]) -> List[Tuple[str, os.stat_result]]:
+        """
+        Чтение одной папки через os.scandir
+        
+        Args:
+            folder_path (str): Путь к папке
+            prefix_len (int): Длина префикса корневой папки в путях
+            subdirs (List[str]): Список, в который добавляются найденные подпапки
+            
+        Returns:
+            List[Tuple[str, os.stat_result]]: Относительные пути файлов и их stat
+        """
+        result = []
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    # Пропускаем скрытые файлы и папки
+                    if entry.name.startswith('.'):
+                        continue
                     
-                file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(file_path, folder_path)
-                
-                try:
-                    stat = os.stat(file_path)
-                    files[rel_path] = {
-                        'size': stat.st_size,
-                        'mtime': stat.st_mtime,
-                        'is_dir': False
-                    }
-                except Exception as e:
-                    logger.error(f"Ошибка при получении информации о файле {file_path}: {e}")
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            result.append((entry.path[prefix_len:], entry.stat()))
+                    except Exception as e:
+                        logger.error(f"Ошибка при получении информации о файле {entry.path}: {e}")
+        except OSError as e:
+            logger.error(f"Ошибка при чтении папки {folder_path}: {e}")
+        return result
+    
+    def _load_state_index(self, config_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузка состояний файлов конфигурации одним запросом
         
-        return files
+        Args:
+            config_id (int): ID конфигурации
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Состояния файлов по относительному пути
+        """
+        return {state['file_path']: state for state in self.db_manager.get_file_states(config_id)}
     
-    def _need_update(self, source_file: str, target_file: str, config_id: int, rel_path: str) -> bool:
+    def _iter_update_checks(self, source_files: FolderIndex, target_files: FolderIndex, source_prefix: str,
+                            target_prefix: str, file_states: Dict[str, Dict[str, Any]]) -> Iterator[bool]:
+        """
+        Конвейерная проверка необходимости обновления файлов
+        
+        Проверяются файлы, присутствующие в обеих папках, в порядке source_files.
+        Проверки (хеширование) выполняются в io_parallelism потоках, в работе
+        одновременно не более LOCAL_PIPELINE_DEPTH файлов, поэтому чтение файлов
+        перекрывается с копированием в вызывающем цикле. Размеры и mtime берутся
+        из списков папок без повторного stat.
+        
+        Args:
+            source_files (FolderIndex): Список файлов исходной папки
+            target_files (FolderIndex): Список файлов целевой папки
+            source_prefix (str): Путь к исходной папке с завершающим разделителем
+            target_prefix (str): Путь к целевой папке с завершающим разделителем
+            file_states (Dict[str, Dict[str, Any]]): Состояния файлов из _load_state_index
+            
+        Yields:
+            bool: True, если файл нужно обновить
+        """
+        with ThreadPoolExecutor(max_workers=self.io_parallelism) as executor:
+            pending = deque()
+            for position, rel_path in enumerate(source_files.paths):
+                target_position = target_files.find(rel_path)
+                if target_position is None:
+                    continue
+                
+                pending.append(executor.submit(
+                    self._need_update, source_prefix + rel_path, target_prefix + rel_path,
+                    file_states.get(rel_path), source_files.meta(position), target_files.meta(target_position)
+                ))
+                if len(pending) >= LOCAL_PIPELINE_DEPTH:
+                    yield pending.popleft().result()
+            
+            while pending:
+                yield pending.popleft().result()
+    
+    def _need_update(self, source_file: str, target_file: str, db_state: Optional[Dict[str, Any]] = None,
+                     source_meta: Optional[Tuple[int, float]] = None,
+                     target_meta: Optional[Tuple[int, float]] = None) -> bool:
         """
         Проверка, нужно ли обновлять файл
         
         Args:
             source_file (str): Путь к исходному файлу
             target_file (str): Путь к целевому файлу
-            config_id (int): ID конфигурации в базе данных
-            rel_path (str): Относительный путь к файлу
+            db_state (Optional[Dict[str, Any]]): Сохраненное состояние файла из _load_state_index
+            source_meta (Optional[Tuple[int, float]]): Размер и mtime исходного файла из FolderIndex
+            target_meta (Optional[Tuple[int, float]]): Размер и mtime целевого файла из FolderIndex
             
         Returns:
             bool: True, если файл нужно обновить
         """
         try:
-            # Получаем информацию о файлах
-            source_stat = os.stat(source_file)
-            target_stat = os.stat(target_file)
+            # Получаем информацию о файлах; данные из списка папки избавляют от повторного stat
+            if source_meta is None:
+                source_stat = os.stat(source_file)
+                source_meta = (source_stat.st_size, source_stat.st_mtime)
+            if target_meta is None:
+                target_stat = os.stat(target_file)
+                target_meta = (target_stat.st_size, target_stat.st_mtime)
+            source_size, source_mtime = source_meta
+            target_size, target_mtime = target_meta
             
             # Проверяем размер файла
-            if source_stat.st_size != target_stat.st_size:
+            if source_size != target_size:
                 return True
             
             # Проверяем время модификации
-            if source_stat.st_mtime > target_stat.st_mtime:
+            if source_mtime > target_mtime + LOCAL_MTIME_TOLERANCE:
                 return True
             
-            # Проверяем хеш файла, если размеры и времена совпадают
+            # Времена совпадают (copy2 переносит mtime), а исходный файл не менялся с последней
+            # синхронизации - файл считается неизменным без чтения содержимого
+            if (abs(source_mtime - target_mtime) <= LOCAL_MTIME_TOLERANCE
+                    and db_state and db_state['file_hash']
+                    and db_state['modified_time'] == source_mtime):
+                return False
+            
+            # Без строгой проверки сравниваем выборки из начала, середины и конца файлов:
+            # чтение не зависит от размера файла
+            if not self.strict_hash:
+                source_sample = FileUtils.get_sample_hash(source_file, algorithm=LOCAL_HASH_ALGORITHM)
+                target_sample = FileUtils.get_sample_hash(target_file, algorithm=LOCAL_HASH_ALGORITHM)
+                if source_sample and target_sample:
+                    return source_sample != target_sample
+            
+            # Проверяем хеш файла, если размеры совпадают, а времена не позволяют решить
             source_hash = self.calculate_file_hash(source_file)
             target_hash = self.calculate_file_hash(target_file)
             
@@ -339,13 +646,12 @@ class LocalSyncManager:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если хеш в базе отличается от текущего, нужно обновить
-                    if state['file_hash'] != source_hash:
-                        return True
-                    break
+            if db_state:
+                # Если хеш в базе отличается от текущего, нужно обновить
+                # (хеши другого алгоритма, сохраненные до перехода на SHA-256, не сравниваются)
+                stored_hash = db_state['file_hash']
+                if stored_hash and stored_hash.startswith(f"{LOCAL_HASH_ALGORITHM}:") and stored_hash != source_hash:
+                    return True
             
             return False
             
@@ -353,8 +659,55 @@ class LocalSyncManager:
             logger.error(f"Ошибка при проверке необходимости обновления файла {source_file}: {e}")
             return True  # В случае ошибки, считаем что файл нужно обновить
     
+    def _copy_file_data(self, source_file: str, target_file: str) -> int:
+        """
+        Копирование содержимого файла
+        
+        На Linux используется os.copy_file_range: копирование выполняется в ядре,
+        а на файловых системах с copy-on-write (btrfs, XFS) файл клонируется без
+        копирования данных. Если системный вызов недоступен или скопировал файл
+        не полностью, файл копируется заново через shutil.copyfile.
+        
+        Args:
+            source_file (str): Путь к исходному файлу
+            target_file (str): Путь к целевому файлу
+            
+        Returns:
+            int: Количество скопированных байт
+            
+        Raises:
+            OSError: Если размер скопированного файла не совпадает с исходным
+        """
+        if hasattr(os, 'copy_file_range'):
+            with open(source_file, 'rb') as src, open(target_file, 'wb') as dst:
+                file_size = remaining = os.fstat(src.fileno()).st_size
+                try:
+                    while remaining > 0:
+                        copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                        if copied == 0:
+                            # Некоторые файловые системы возвращают 0 до конца файла
+                            break
+                        remaining -= copied
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                        raise
+                    logger.debug(f"copy_file_range недоступен для {source_file}: {e}")
+                else:
+                    if remaining == 0:
+                        target_size = os.fstat(dst.fileno()).st_size
+                        if target_size != file_size:
+                            raise OSError(f"Размер скопированного файла {target_size} "
+                                          f"не совпадает с исходным {file_size}: {source_file}")
+                        return file_size
+                    logger.debug(f"copy_file_range скопировал {file_size - remaining} из {file_size} байт "
+                                 f"для {source_file}, файл копируется заново")
+        
+        # Целевой файл открывается заново с усечением, частично скопированные данные не остаются
+        shutil.copyfile(source_file, target_file)
+        return os.stat(target_file).st_size
+    
     def _copy_file(self, source_file: str, target_file: str, 
-                  callback: Optional[Callable[[str, str], None]] = None) -> bool:
+                  callback: Optional[Callable[[str, str], None]] = None) -> Optional[int]:
         """
         Копирование файла
         
@@ -364,35 +717,27 @@ class LocalSyncManager:
             callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
             
         Returns:
-            bool: True, если копирование успешно
+            Optional[int]: Количество скопированных байт или None в случае ошибки
         """
         try:
-            # Создаем резервную копию целевого файла, если он существует
-            backup_created = False
-            if os.path.exists(target_file):
-                backup_file = target_file + ".bak"
-                try:
-                    shutil.copy2(target_file, backup_file)
-                    backup_created = True
-                except Exception as e:
-                    logger.warning(f"Не удалось создать резервную копию файла {target_file}: {e}")
-            
-            # Копируем файл
-            shutil.copy2(source_file, target_file)
-            
-            # Удаляем резервную копию, если она была создана
-            if backup_created:
-                try:
-                    os.remove(target_file + ".bak")
-                except Exception as e:
-                    logger.warning(f"Не удалось удалить резервную копию файла {target_file}: {e}")
+            # Копируем во временный файл рядом с целевым и атомарно подменяем его:
+            # при сбое целевой файл остается прежним, резервная копия не нужна
+            temp_file = f"{target_file}.tmp-{os.getpid()}"
+            try:
+                file_size = self._copy_file_data(source_file, temp_file)
+                shutil.copystat(source_file, temp_file)
+                os.replace(temp_file, target_file)
+            except Exception:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
             
             info_msg = f"Скопирован файл: {os.path.basename(source_file)}"
             logger.info(info_msg)
             if callback:
                 callback(info_msg, "info")
             
-            return True
+            return file_size
         except Exception as e:
             error_msg = f"Ошибка при копировании файла {source_file} -> {target_file}: {e}"
             logger.error(error_msg)
@@ -400,7 +745,7 @@ class LocalSyncManager:
                 callback(error_msg, "error")
             
             self.sync_stats['errors'] += 1
-            return False
+            return None
     
     def _delete_file(self, file_path: str, 
                     callback: Optional[Callable[[str, str], None]] = None) -> bool:
@@ -438,30 +783,72 @@ class LocalSyncManager:
             self.sync_stats['errors'] += 1
             return False
     
-    def _update_file_state_in_db(self, config_id: int, rel_path: str, file_path: str, sync_status: str):
+    def _write_file_states(self, config_id: int,
+                           files: List[Tuple[str, str, Optional[str], Optional[Tuple[int, float]]]]):
         """
-        Обновление состояния файла в базе данных
+        Запись состояний набора файлов в базу данных одной транзакцией
         
         Args:
             config_id (int): ID конфигурации
-            rel_path (str): Относительный путь к файлу
-            file_path (str): Полный путь к файлу
-            sync_status (str): Статус синхронизации
+            files (List[Tuple[str, str, Optional[str], Optional[Tuple[int, float]]]]): Относительный путь,
+                полный путь, хеш файла и его размер с mtime, если они уже известны
         """
+        rows = []
+        for rel_path, file_path, file_hash, file_meta in files:
+            try:
+                if file_hash is None:
+                    file_hash = self.calculate_file_hash(file_path)
+                if file_meta is None:
+                    file_stat = os.stat(file_path)
+                    file_meta = (file_stat.st_size, file_stat.st_mtime)
+                rows.append((rel_path, file_hash, file_meta[1], 'synced', file_meta[0]))
+            except Exception as e:
+                logger.error(f"Ошибка при получении информации о файле {file_path}: {e}")
+        
+        if not rows:
+            return
+        
         try:
-            file_hash = self.calculate_file_hash(file_path)
-            file_stat = os.stat(file_path)
-            
-            self.db_manager.update_file_state(
-                config_id=config_id,
-                file_path=rel_path,
-                file_hash=file_hash,
-                modified_time=file_stat.st_mtime,
-                sync_status=sync_status
-            )
+            self.db_manager.bulk_update_file_states(config_id, rows)
         except Exception as e:
             logger.error(f"Ошибка при обновлении состояния файла в базе данных: {e}")
     
+    def _log_file_operation(self, file_operations: List[Tuple[Any, ...]], operation_type: str, rel_path: str,
+                            source_file: Optional[str], target_file: Optional[str], file_size: int):
+        """
+        Добавление операции в журнал текущей синхронизации
+        
+        Операции накапливаются и записываются в базу пакетами по LOCAL_DB_BATCH_SIZE записей.
+        
+        Args:
+            file_operations (List[Tuple[Any, ...]]): Накопленные операции
+            operation_type (str): Тип операции
+            rel_path (str): Относительный путь к файлу
+            source_file (Optional[str]): Путь к исходному файлу
+            target_file (Optional[str]): Путь к целевому файлу
+            file_size (int): Размер файла
+        """
+        file_operations.append((self.current_sync_id, operation_type, rel_path,
+                                source_file, target_file, file_size, 'success', None))
+        if len(file_operations) >= LOCAL_DB_BATCH_SIZE:
+            self._flush_file_operations(file_operations)
+    
+    def _flush_file_operations(self, file_operations: List[Tuple[Any, ...]]):
+        """
+        Запись накопленных операций в базу данных
+        
+        Args:
+            file_operations (List[Tuple[Any, ...]]): Накопленные операции; список очищается
+        """
+        if not file_operations:
+            return
+        
+        try:
+            self.db_manager.add_file_operations(file_operations)
+        except Exception as e:
+            logger.error(f"Ошибка при логировании операций с файлами: {e}")
+        file_operations.clear()
+    
     def update_file_states(self, config_id: int, source_path: str):
         """
         Обновление состояний файлов в базе данных
@@ -474,16 +861,33 @@ class LocalSyncManager:
             # Получаем список файлов в исходной папке
             source_files = self._get_files_list(source_path)
             
-            # Обновляем состояние каждого файла
-            for rel_path in source_files:
-                file_path = os.path.join(source_path, rel_path)
-                self._update_file_state_in_db(config_id, rel_path, file_path, 'synced')
+            source_prefix = os.path.join(source_path, '')
+            file_states = self._load_state_index(config_id)
+            
+            # Хеш из базы переиспользуется, если размер и mtime файла не изменились;
+            # остальные файлы хешируются параллельно, запись в базу - одной транзакцией
+            entries = []
+            for position, rel_path in enumerate(source_files.paths):
+                file_meta = source_files.meta(position)
+                state = file_states.get(rel_path)
+                stored_hash = None
+                if (state and state['file_hash']
+                        and state['file_hash'].startswith(f"{LOCAL_HASH_ALGORITHM}:")
+                        and state['file_size'] == file_meta[0]
+                        and state['modified_time'] == file_meta[1]):
+                    stored_hash = state['file_hash']
+                entries.append((rel_path, source_prefix + rel_path, stored_hash, file_meta))
+            
+            file_hashes = self._hash_files([file_path for _, file_path, file_hash, _ in entries if file_hash is None])
+            self._write_file_states(config_id, [
+                (rel_path, file_path, file_hash or file_hashes[file_path], file_meta)
+                for rel_path, file_path, file_hash, file_meta in entries
+            ])
             
             # Удаляем из базы данных записи о файлах, которых больше нет в исходной папке
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] not in source_files:
-                    self.db_manager.delete_file_state(config_id, state['file_path'])
+            self.db_manager.delete_file_states(config_id, [
+                rel_path for rel_path in file_states if rel_path not in source_files
+            ])
             
             logger.info(f"Обновлены состояния файлов для конфигурации {config_id}")
             
@@ -530,27 +934,35 @@ class LocalSyncManager:
             source_files = self._get_files_list(source_path)
             target_files = self._get_files_list(target_path)
             
-            # Файлы, которые есть только в источнике
-            for rel_path in source_files:
-                if rel_path not in target_files:
+            # Один проход по источнику: общие файлы отмечаются в matched,
+            # неотмеченные файлы есть только в целевой папке
+            matched = bytearray(len(target_files))
+            source_sizes, target_sizes = source_files.sizes, target_files.sizes
+            for position, rel_path in enumerate(source_files.paths):
+                target_position = target_files.find(rel_path)
+                if target_position is None:
                     result['only_in_source'].append(rel_path)
+                    continue
+                matched[target_position] = 1
+                
+                # Разный размер определяется по массивам индекса без обращения к диску
+                if source_sizes[position] != target_sizes[target_position]:
+                    result['different'].append(rel_path)
+                    continue
+                
+                source_file = os.path.join(source_path, rel_path)
+                target_file = os.path.join(target_path, rel_path)
+                
+                # Сравниваем файлы
+                if self._need_update(source_file, target_file, None,
+                                     source_files.meta(position), target_files.meta(target_position)):
+                    result['different'].append(rel_path)
+                else:
+                    result['identical'].append(rel_path)
             
-            # Файлы, которые есть только в целевой папке
-            for rel_path in target_files:
-                if rel_path not in source_files:
-                    result['only_in_target'].append(rel_path)
-            
-            # Файлы, которые есть в обеих папках
-            for rel_path in source_files:
-                if rel_path in target_files:
-                    source_file = os.path.join(source_path, rel_path)
-                    target_file = os.path.join(target_path, rel_path)
-                    
-                    # Сравниваем файлы
-                    if self._need_update(source_file, target_file, -1, rel_path):
-                        result['different'].append(rel_path)
-                    else:
-                        result['identical'].append(rel_path)
+            result['only_in_target'].extend(
+                rel_path for rel_path, seen in zip(target_files.paths, matched) if not seen
+            )
             
             return result
             
@@ -558,6 +970,20 @@ class LocalSyncManager:
             logger.error(f"Ошибка при сравнении папок: {e}")
             return result
     
+    @staticmethod
+    def _mk_info(files: FolderIndex, position: int) -> Dict[str, Any]:
+        """
+        Описание файла для предварительного просмотра
+        
+        Args:
+            files (FolderIndex): Список файлов папки
+            position (int): Позиция файла в списке
+            
+        Returns:
+            Dict[str, Any]: Путь, размер и время модификации файла
+        """
+        return {'path': files.paths[position], 'size': files.sizes[position], 'mtime': files.mtimes[position]}
+    
     def preview_sync(self, config_id: int, source_path: str, target_path: str) -> Dict[str, Any]:
         """
         Предварительный просмотр синхронизации без выполнения операций
@@ -586,46 +1012,36 @@ class LocalSyncManager:
             
             # Получаем списки файлов
             source_files = self._get_files_list(source_path)
-            target_files = self._get_files_list(target_path) if os.path.exists(target_path) else {}
-            
-            # Файлы для копирования
-            for rel_path in source_files:
-                if rel_path not in target_files:
-                    source_file = os.path.join(source_path, rel_path)
-                    file_info = {
-                        'path': rel_path,
-                        'size': source_files[rel_path]['size'],
-                        'mtime': source_files[rel_path]['mtime']
-                    }
-                    preview['to_copy'].append(file_info)
+            target_files = self._get_files_list(target_path) if os.path.exists(target_path) else FolderIndex()
+            file_states = self._load_state_index(config_id)
+            
+            # Файлы для копирования и обновления
+            matched = bytearray(len(target_files))
+            for position, rel_path in enumerate(source_files.paths):
+                target_position = target_files.find(rel_path)
+                if target_position is None:
+                    preview['to_copy'].append(self._mk_info(source_files, position))
+                    continue
+                matched[target_position] = 1
+                
+                # Разный размер определяется по массивам индекса без обращения к диску
+                if source_files.sizes[position] != target_files.sizes[target_position]:
+                    preview['to_update'].append(self._mk_info(source_files, position))
+                    continue
+                
+                source_file = os.path.join(source_path, rel_path)
+                target_file = os.path.join(target_path, rel_path)
+                
+                if self._need_update(source_file, target_file, file_states.get(rel_path),
+                                     source_files.meta(position), target_files.meta(target_position)):
+                    preview['to_update'].append(self._mk_info(source_files, position))
                 else:
-                    source_file = os.path.join(source_path, rel_path)
-                    target_file = os.path.join(target_path, rel_path)
-                    
-                    if self._need_update(source_file, target_file, config_id, rel_path):
-                        file_info = {
-                            'path': rel_path,
-                            'size': source_files[rel_path]['size'],
-                            'mtime': source_files[rel_path]['mtime']
-                        }
-                        preview['to_update'].append(file_info)
-                    else:
-                        file_info = {
-                            'path': rel_path,
-                            'size': source_files[rel_path]['size'],
-                            'mtime': source_files[rel_path]['mtime']
-                        }
-                        preview['to_skip'].append(file_info)
-            
-            # Файлы для удаления
-            for rel_path in target_files:
-                if rel_path not in source_files:
-                    file_info = {
-                        'path': rel_path,
-                        'size': target_files[rel_path]['size'],
-                        'mtime': target_files[rel_path]['mtime']
-                    }
-                    preview['to_delete'].append(file_info)
+                    preview['to_skip'].append(self._mk_info(source_files, position))
+            
+            # Файлы для удаления: не сопоставленные с файлами источника
+            for position, seen in enumerate(matched):
+                if not seen:
+                    preview['to_delete'].append(self._mk_info(target_files, position))
             
             return preview
             
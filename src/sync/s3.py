@@ -1,14 +1,20 @@
 import os
 import hashlib
+import mmap
 import time
 import logging
 import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Callable, Any, Union
+from typing import Dict, List, Set, Tuple, Optional, Callable, Any, Union, Iterable, Iterator
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
     from botocore.exceptions import ClientError, NoCredentialsError
     S3_AVAILABLE = True
 except ImportError:
@@ -18,6 +24,27 @@ from src.sync.utils import FileUtils, TimeUtils, CryptoUtils, NetworkUtils
 
 logger = logging.getLogger(__name__)
 
+# Количество параллельных передач файлов по умолчанию
+S3_MAX_WORKERS = 16
+# Максимальное количество задач передачи, ожидающих выполнения в пуле потоков
+S3_MAX_PENDING_TASKS = 64
+# Размер пула HTTP-соединений клиента (с запасом на потоки составных загрузок)
+S3_MAX_POOL_CONNECTIONS = 64
+# Размер файла, начиная с которого используется составная (multipart) загрузка, байты
+S3_MULTIPART_THRESHOLD = 64 * 1024 * 1024
+# Размер части составной загрузки, байты (от него зависит ETag составных объектов)
+S3_MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+# Количество параллельно передаваемых частей одного файла
+S3_TRANSFER_CONCURRENCY = 10
+# Количество потоков для вычисления MD5 частей составного ETag
+S3_ETAG_WORKERS = 4
+# Размер буфера чтения/записи менеджера передач, байты (по умолчанию в boto3 - 256 КБ)
+S3_IO_CHUNKSIZE = 1024 * 1024
+# Максимальное количество ключей в одном запросе delete_objects (ограничение API S3)
+S3_DELETE_BATCH_SIZE = 1000
+# Количество изменений состояний файлов, накапливаемых перед записью в базу одной транзакцией
+S3_DB_BATCH_SIZE = 500
+
 class S3SyncManager:
     """Менеджер синхронизации с S3-совместимыми хранилищами (R2, S3 и др.)"""
     
@@ -41,9 +68,17 @@ class S3SyncManager:
             'errors': 0
         }
         self.current_sync_id = None
+        # Состояния файлов текущей синхронизации по относительному пути (None вне синхронизации)
+        self._state_index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._stats_lock = threading.Lock()
+        self._worker_local: Optional[threading.local] = None
+        self.max_workers = S3_MAX_WORKERS
+        self._transfer_config = None
+        # Состояния файлов, ожидающие записи в базу данных (пополняются из рабочих потоков)
+        self._pending_states: List[Tuple[Any, ...]] = []
     
     def connect(self, access_key: str, secret_key: str, endpoint_url: Optional[str] = None, 
-               region_name: str = 'us-east-1', use_ssl: bool = True) -> bool:
+               region_name: str = 'us-east-1', use_ssl: bool = True, bucket_name: Optional[str] = None) -> bool:
         """
         Подключение к S3-совместимому хранилищу
         
@@ -53,6 +88,7 @@ class S3SyncManager:
             endpoint_url (Optional[str]): URL конечной точки (для не-AWS S3, например Cloudflare R2)
             region_name (str): Регион (по умолчанию us-east-1)
             use_ssl (bool): Использовать ли SSL
+            bucket_name (Optional[str]): Бакет для проверки подключения (без него - list_buckets)
             
         Returns:
             bool: True, если подключение успешно
@@ -62,6 +98,18 @@ class S3SyncManager:
             return False
         
         try:
+            # Пул соединений клиента рассчитан на параллельные передачи файлов
+            client_config = BotoConfig(max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+            
+            # Большие файлы передаются частями в несколько потоков через менеджер передач boto3
+            self._transfer_config = TransferConfig(
+                multipart_threshold=S3_MULTIPART_THRESHOLD,
+                multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                max_concurrency=S3_TRANSFER_CONCURRENCY,
+                io_chunksize=S3_IO_CHUNKSIZE,
+                use_threads=True
+            )
+            
             # Создаем клиент и ресурс S3
             session = boto3.Session(
                 aws_access_key_id=access_key,
@@ -75,14 +123,24 @@ class S3SyncManager:
                 if not endpoint_url.startswith(('http://', 'https://')):
                     endpoint_url = f"https://{endpoint_url}" if use_ssl else f"http://{endpoint_url}"
                 
-                self.s3_client = session.client('s3', endpoint_url=endpoint_url, use_ssl=use_ssl)
+                self.s3_client = session.client('s3', endpoint_url=endpoint_url, use_ssl=use_ssl,
+                                                config=client_config)
                 self.s3_resource = session.resource('s3', endpoint_url=endpoint_url, use_ssl=use_ssl)
             else:
-                self.s3_client = session.client('s3', use_ssl=use_ssl)
+                self.s3_client = session.client('s3', use_ssl=use_ssl, config=client_config)
                 self.s3_resource = session.resource('s3', use_ssl=use_ssl)
             
-            # Проверяем подключение, пытаясь получить список бакетов
-            self.s3_client.list_buckets()
+            # Проверяем подключение запросом head_bucket к рабочему бакету: он не требует
+            # права s3:ListAllMyBuckets и не возвращает список всех бакетов
+            if bucket_name:
+                try:
+                    self.s3_client.head_bucket(Bucket=bucket_name)
+                except ClientError as e:
+                    # Отсутствующий бакет не мешает подключению - он будет создан при синхронизации
+                    if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchBucket', 'NotFound'):
+                        raise
+            else:
+                self.s3_client.list_buckets()
             
             logger.info(f"Подключение к S3-хранилищу выполнено успешно")
             if endpoint_url:
@@ -180,7 +238,7 @@ class S3SyncManager:
             return self.sync_stats
         
         bucket_name = target_info.get('bucket_name', '')
-        prefix = target_info.get('prefix', '')
+        prefix = self._normalize_prefix(target_info.get('prefix', ''))
         
         if not bucket_name:
             error_msg = "Не указано имя бакета S3-хранилища"
@@ -224,6 +282,9 @@ class S3SyncManager:
             return self.sync_stats
         
         try:
+            # Состояния файлов загружаем из базы один раз на всю синхронизацию
+            self._state_index = self._load_state_index(config_id)
+            
             if direction == 'upload':
                 # Синхронизация из локальной папки в S3
                 self._sync_upload(config_id, source_path, bucket_name, prefix, callback, delete_mode)
@@ -286,6 +347,149 @@ class S3SyncManager:
                 )
             
             return self.sync_stats
+        
+        finally:
+            self._state_index = None
+    
+    def _increment_stat(self, key: str, value: int = 1):
+        """
+        Потокобезопасное увеличение счетчика статистики
+        
+        В рабочих потоках _run_parallel счетчики накапливаются локально в потоке
+        и сливаются в sync_stats по завершении, без общей блокировки на каждый файл.
+        
+        Args:
+            key (str): Ключ счетчика в sync_stats
+            value (int): Величина приращения
+        """
+        worker_local = self._worker_local
+        stats = getattr(worker_local, 'stats', None) if worker_local is not None else None
+        if stats is not None:
+            stats[key] += value
+            return
+        
+        with self._stats_lock:
+            self.sync_stats[key] += value
+    
+    def _run_parallel(self, tasks: Iterable[Tuple[Callable[..., None], tuple]]):
+        """
+        Параллельное выполнение передач файлов
+        
+        Задачи берутся из итератора по мере освобождения пула: в очереди находится
+        не более S3_MAX_PENDING_TASKS задач, поэтому обход больших деревьев не
+        накапливает задачи и future в памяти.
+        
+        Args:
+            tasks (Iterable[Tuple[Callable[..., None], tuple]]): Пары (функция, аргументы)
+        """
+        worker_local = threading.local()
+        worker_stats: List[Counter] = []
+        pending = threading.BoundedSemaphore(S3_MAX_PENDING_TASKS)
+        
+        def _run_task(func: Callable[..., None], args: tuple):
+            if getattr(worker_local, 'stats', None) is None:
+                worker_local.stats = Counter()
+                with self._stats_lock:
+                    worker_stats.append(worker_local.stats)
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"Ошибка при выполнении передачи файла: {e}")
+                self._increment_stat('errors')
+        
+        self._worker_local = worker_local
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+                for func, args in tasks:
+                    pending.acquire()
+                    future = executor.submit(_run_task, func, args)
+                    future.add_done_callback(lambda _: pending.release())
+        finally:
+            self._worker_local = None
+            # Потоки пула завершены, сливаем их счетчики в общую статистику
+            with self._stats_lock:
+                for stats in worker_stats:
+                    for key, value in stats.items():
+                        self.sync_stats[key] += value
+    
+    def _upload_task(self, config_id: int, local_file_path: str, rel_path: str, bucket_name: str, s3_key: str,
+                     obj: Optional[Dict[str, Any]], callback: Optional[Callable[[str, str], None]] = None,
+                     local_stat: Optional[os.stat_result] = None):
+        """
+        Проверка и загрузка одного файла в рабочем потоке
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            local_file_path (str): Путь к локальному файлу
+            rel_path (str): Относительный путь к файлу
+            bucket_name (str): Имя бакета S3
+            s3_key (str): Ключ объекта в S3
+            obj (Optional[Dict[str, Any]]): Информация об объекте из _get_s3_objects (None, если объекта нет)
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            local_stat (Optional[os.stat_result]): Результат stat файла, полученный при обходе папки
+        """
+        # В базу записывается stat, по которому принималось решение о загрузке:
+        # файл, измененный во время загрузки, не должен считаться синхронизированным
+        if local_stat is None:
+            try:
+                local_stat = os.stat(local_file_path)
+            except OSError as e:
+                logger.error(f"Ошибка при получении информации о файле {local_file_path}: {e}")
+                self._increment_stat('errors')
+                return
+        
+        if obj is not None:
+            object_mtime = obj['mtime']
+            object_size = obj['size']
+            object_etag = obj['etag']
+            
+            # Объект существует в S3, проверяем, нужно ли обновлять
+            if not self._need_upload(local_file_path, object_mtime, object_size, object_etag, config_id, rel_path,
+                                     local_stat):
+                self._increment_stat('skipped')
+                debug_msg = f"Файл пропущен (без изменений): {rel_path}"
+                logger.debug(debug_msg)
+                if callback:
+                    callback(debug_msg, "debug")
+                return
+        
+        if self._upload_file(local_file_path, bucket_name, s3_key, callback):
+            self._increment_stat('updated' if obj is not None else 'uploaded')
+            
+            # Состояние файла записывается в базу пакетом
+            self._queue_file_state(config_id, rel_path, local_file_path, 'synced', local_stat)
+    
+    def _download_task(self, config_id: int, bucket_name: str, s3_key: str, obj: Dict[str, Any],
+                       local_file_path: str, rel_path: str,
+                       exists_locally: bool, callback: Optional[Callable[[str, str], None]] = None):
+        """
+        Проверка и скачивание одного файла в рабочем потоке
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            bucket_name (str): Имя бакета S3
+            s3_key (str): Ключ объекта в S3
+            obj (Dict[str, Any]): Информация об объекте из _get_s3_objects
+            local_file_path (str): Путь для сохранения файла
+            rel_path (str): Относительный путь к файлу
+            exists_locally (bool): Есть ли файл в локальной папке
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+        """
+        # Файл есть локально, проверяем, нужно ли обновлять
+        if exists_locally and not self._need_download(local_file_path, obj['mtime'], obj['size'], obj['etag'],
+                                                      config_id, rel_path):
+            self._increment_stat('skipped')
+            debug_msg = f"Файл пропущен (без изменений): {rel_path}"
+            logger.debug(debug_msg)
+            if callback:
+                callback(debug_msg, "debug")
+            return
+        
+        if self._download_file(bucket_name, s3_key, local_file_path, callback):
+            self._increment_stat('downloaded')
+            
+            # Состояние файла записывается в базу пакетом
+            self._queue_file_state(config_id, rel_path, local_file_path, 'synced')
     
     def _sync_upload(self, config_id: int, source_path: str, bucket_name: str, prefix: str, 
                     callback: Optional[Callable[[str, str], None]] = None, 
@@ -313,81 +517,48 @@ class S3SyncManager:
         # Получаем список объектов в S3
         s3_objects = self._get_s3_objects(bucket_name, prefix)
         
-        # Синхронизируем файлы из локальной папки в S3
-        for root, dirs, files in os.walk(source_path):
-            # Пропускаем скрытые папки
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for filename in files:
-                # Пропускаем скрытые файлы
-                if filename.startswith('.'):
-                    continue
-                    
-                local_file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(local_file_path, source_path)
-                
+        # Задачи загрузки формируются по ходу обхода локальной папки, без списка всех файлов
+        def _iter_uploads():
+            for local_file_path, rel_path, file_stat in self._iter_local_files(source_path):
                 # Определяем ключ объекта в S3
-                s3_key = os.path.join(prefix, rel_path).replace("\\", "/")
+                s3_key = prefix + rel_path.replace(os.sep, '/')
                 
-                # Проверяем, существует ли объект в S3
-                object_exists = False
-                object_mtime = None
-                object_size = None
-                object_etag = None
-                
-                for obj in s3_objects:
-                    if obj['key'] == s3_key:
-                        object_exists = True
-                        object_mtime = obj['last_modified'].timestamp()
-                        object_size = obj['size']
-                        object_etag = obj['etag'].strip('"')
-                        break
-                
-                if object_exists:
-                    # Объект существует в S3, проверяем, нужно ли обновлять
-                    if self._need_upload(local_file_path, object_mtime, object_size, object_etag, config_id, rel_path):
-                        if self._upload_file(local_file_path, bucket_name, s3_key, callback):
-                            self.sync_stats['updated'] += 1
-                            
-                            # Обновляем состояние файла в базе данных
-                            self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                    else:
-                        self.sync_stats['skipped'] += 1
-                        debug_msg = f"Файл пропущен (без изменений): {rel_path}"
-                        logger.debug(debug_msg)
-                        if callback:
-                            callback(debug_msg, "debug")
-                else:
-                    # Объекта нет в S3, загружаем
-                    if self._upload_file(local_file_path, bucket_name, s3_key, callback):
-                        self.sync_stats['uploaded'] += 1
-                        
-                        # Обновляем состояние файла в базе данных
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+                yield self._upload_task, (config_id, local_file_path, rel_path, bucket_name, s3_key,
+                                          s3_objects.get(s3_key), callback, file_stat)
+        
+        # Проверяем и загружаем файлы в S3 параллельно
+        self._run_parallel(_iter_uploads())
+        self._flush_file_states(config_id)
         
         # Удаляем объекты, которые есть в S3, но отсутствуют локально
         if delete_mode:
-            for obj in s3_objects:
-                s3_key = obj['key']
-                
-                # Пропускаем объекты, которые не соответствуют префиксу
-                if prefix and not s3_key.startswith(prefix):
-                    continue
-                
-                # Определяем относительный путь
-                if prefix:
-                    rel_path = s3_key[len(prefix):].lstrip('/')
-                else:
-                    rel_path = s3_key
+            stale_objects = []
+            deleted_paths = []
+            for s3_key in s3_objects:
+                # Листинг ограничен префиксом, относительный путь - остаток ключа
+                rel_path = s3_key[len(prefix):]
                 
                 local_file_path = os.path.join(source_path, rel_path.replace("/", os.sep))
                 
                 if not os.path.exists(local_file_path):
-                    if self._delete_object(bucket_name, s3_key, callback):
-                        self.sync_stats['deleted'] += 1
-                        
-                        # Удаляем состояние файла из базы данных
-                        self.db_manager.delete_file_state(config_id, rel_path)
+                    stale_objects.append((s3_key, rel_path))
+            
+            # Удаляем объекты пакетами по S3_DELETE_BATCH_SIZE ключей за запрос
+            for start in range(0, len(stale_objects), S3_DELETE_BATCH_SIZE):
+                batch = stale_objects[start:start + S3_DELETE_BATCH_SIZE]
+                deleted_keys = self._delete_objects(bucket_name, [s3_key for s3_key, _ in batch], callback)
+                
+                for s3_key, rel_path in batch:
+                    if s3_key not in deleted_keys:
+                        continue
+                    self.sync_stats['deleted'] += 1
+                    
+                    # Состояния удаленных файлов удаляются из базы пакетами
+                    deleted_paths.append(rel_path)
+                    if len(deleted_paths) >= S3_DB_BATCH_SIZE:
+                        self._delete_file_states(config_id, deleted_paths)
+            
+            self._delete_file_states(config_id, deleted_paths)
     
     def _sync_download(self, config_id: int, target_path: str, bucket_name: str, prefix: str, 
                       callback: Optional[Callable[[str, str], None]] = None, 
@@ -428,25 +599,14 @@ class S3SyncManager:
             self.sync_stats['errors'] += 1
             return
         
-        # Получаем список объектов в S3
-        s3_objects = self._get_s3_objects(bucket_name, prefix)
-        
-        # Получаем список локальных файлов
-        local_files = self._get_local_files(target_path)
+        # Получаем списки объектов в S3 и локальных файлов одновременно
+        s3_objects, local_files = self._get_listings(bucket_name, prefix, target_path)
         
         # Синхронизируем файлы из S3 в локальную папку
-        for obj in s3_objects:
-            s3_key = obj['key']
-            
-            # Пропускаем объекты, которые не соответствуют префиксу
-            if prefix and not s3_key.startswith(prefix):
-                continue
-            
-            # Определяем относительный путь
-            if prefix:
-                rel_path = s3_key[len(prefix):].lstrip('/')
-            else:
-                rel_path = s3_key
+        downloads = []
+        for s3_key, obj in s3_objects.items():
+            # Листинг ограничен префиксом, относительный путь - остаток ключа
+            rel_path = s3_key[len(prefix):]
             
             local_file_path = os.path.join(target_path, rel_path)
             
@@ -464,50 +624,51 @@ class S3SyncManager:
                     self.sync_stats['errors'] += 1
                     continue
             
-            # Проверяем, существует ли файл локально
-            if rel_path not in local_files:
-                # Файла нет локально, скачиваем
-                if self._download_file(bucket_name, s3_key, local_file_path, callback):
-                    self.sync_stats['downloaded'] += 1
-                    
-                    # Обновляем состояние файла в базе данных
-                    self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-            else:
-                # Файл есть локально, проверяем, нужно ли обновлять
-                if self._need_download(bucket_name, s3_key, local_file_path, config_id, rel_path):
-                    if self._download_file(bucket_name, s3_key, local_file_path, callback):
-                        self.sync_stats['downloaded'] += 1
-                        
-                        # Обновляем состояние файла в базе данных
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
-                else:
-                    self.sync_stats['skipped'] += 1
-                    debug_msg = f"Файл пропущен (без изменений): {rel_path}"
-                    logger.debug(debug_msg)
-                    if callback:
-                        callback(debug_msg, "debug")
+            downloads.append((self._download_task, (config_id, bucket_name, s3_key, obj, local_file_path, rel_path,
+                                                    rel_path in local_files, callback)))
+        
+        # Проверяем и скачиваем файлы из S3 параллельно
+        self._run_parallel(downloads)
+        self._flush_file_states(config_id)
         
         # Удаляем файлы, которые есть локально, но отсутствуют в S3
         if delete_mode:
+            deleted_paths = []
             for rel_path in local_files:
-                s3_key = os.path.join(prefix, rel_path).replace("\\", "/")
+                s3_key = prefix + rel_path.replace(os.sep, '/')
                 
                 # Проверяем, существует ли объект в S3
-                object_exists = False
-                for obj in s3_objects:
-                    if obj['key'] == s3_key:
-                        object_exists = True
-                        break
-                
-                if not object_exists:
+                if s3_key not in s3_objects:
                     local_file_path = os.path.join(target_path, rel_path)
                     if self._delete_local_file(local_file_path, callback):
                         self.sync_stats['deleted'] += 1
                         
-                        # Удаляем состояние файла из базы данных
-                        self.db_manager.delete_file_state(config_id, rel_path)
+                        # Состояния удаленных файлов удаляются из базы пакетами
+                        deleted_paths.append(rel_path)
+                        if len(deleted_paths) >= S3_DB_BATCH_SIZE:
+                            self._delete_file_states(config_id, deleted_paths)
+            
+            self._delete_file_states(config_id, deleted_paths)
     
-    def _get_s3_objects(self, bucket_name: str, prefix: str = '') -> List[Dict[str, Any]]:
+    @staticmethod
+    def _normalize_prefix(prefix: str) -> str:
+        """
+        Приведение префикса к виду "папка/"
+        
+        Префикс с завершающим "/" ограничивает листинг содержимым "папки" (без соседних
+        ключей вида "папка2/...") и на ряде S3-совместимых хранилищ выполняется быстрее.
+        
+        Args:
+            prefix (str): Префикс в бакете S3
+            
+        Returns:
+            str: Префикс с завершающим "/" или пустая строка
+        """
+        if prefix and not prefix.endswith('/'):
+            prefix = prefix + '/'
+        return prefix
+    
+    def _get_s3_objects(self, bucket_name: str, prefix: str = '') -> Dict[str, Dict[str, Any]]:
         """
         Получение списка объектов в S3-бакете
         
@@ -516,35 +677,107 @@ class S3SyncManager:
             prefix (str): Префикс для фильтрации объектов
             
         Returns:
-            List[Dict[str, Any]]: Список словарей с информацией об объектах
+            Dict[str, Dict[str, Any]]: Информация об объектах по их ключам
         """
-        objects = []
+        objects = {}
         
         try:
             # Создаем пагинатор для обработки большого количества объектов
             paginator = self.s3_client.get_paginator('list_objects_v2')
             
             # Формируем параметры запроса
-            params = {'Bucket': bucket_name}
+            prefix = self._normalize_prefix(prefix)
+            params = {'Bucket': bucket_name, 'Delimiter': '/'}
             if prefix:
                 params['Prefix'] = prefix
             
-            # Получаем все страницы с объектами
+            # Сначала получаем объекты верхнего уровня и список вложенных префиксов
+            sub_prefixes = []
             for page in paginator.paginate(**params):
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        objects.append({
-                            'key': obj['Key'],
-                            'size': obj['Size'],
-                            'last_modified': obj['LastModified'],
-                            'etag': obj['ETag']
-                        })
+                for obj in page.get('Contents', []):
+                    objects[obj['Key']] = self._make_object_info(obj)
+                for common_prefix in page.get('CommonPrefixes', []):
+                    sub_prefixes.append(common_prefix['Prefix'])
+            
+            if not sub_prefixes:
+                return objects
+            
+            # Вложенные префиксы листаем параллельно, каждый своим пагинатором
+            workers = min(self.max_workers, len(sub_prefixes))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for prefix_objects in executor.map(
+                        lambda sub_prefix: self._list_prefix(bucket_name, sub_prefix),
+                        sub_prefixes):
+                    objects.update(prefix_objects)
             
             return objects
             
         except ClientError as e:
             logger.error(f"Ошибка при получении списка объектов из S3: {e}")
-            return []
+            return {}
+    
+    def _list_prefix(self, bucket_name: str, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Получение всех объектов под одним префиксом (без разделителя)
+        
+        Args:
+            bucket_name (str): Имя бакета
+            prefix (str): Префикс, который нужно обойти целиком
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Информация об объектах по их ключам
+        """
+        objects = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = self._make_object_info(obj)
+        return objects
+    
+    @staticmethod
+    def _make_object_info(obj: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Преобразование записи из list_objects_v2 в информацию об объекте
+        
+        Время изменения и ETag приводятся к виду для сравнения один раз при
+        получении списка, а не при каждой проверке файла.
+        
+        Args:
+            obj (Dict[str, Any]): Запись из поля Contents ответа S3
+            
+        Returns:
+            Dict[str, Any]: Размер, время изменения (timestamp) и ETag без кавычек
+        """
+        return {
+            'size': obj['Size'],
+            'mtime': obj['LastModified'].timestamp(),
+            'etag': obj['ETag'].strip('"')
+        }
+    
+    def _get_listings(self, bucket_name: str, prefix: str, 
+                      folder_path: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Одновременное получение списка объектов в S3 и списка локальных файлов
+        
+        Обход локальной папки выполняется в отдельном потоке, пока основной поток
+        ждет ответов list_objects_v2, поэтому время сканирования перекрывается
+        сетевыми задержками листинга.
+        
+        Args:
+            bucket_name (str): Имя бакета
+            prefix (str): Префикс в бакете S3
+            folder_path (str): Путь к локальной папке
+            
+        Returns:
+            Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]: Объекты в S3 и локальные файлы
+        """
+        if not os.path.exists(folder_path):
+            return self._get_s3_objects(bucket_name, prefix), {}
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            local_future = executor.submit(self._get_local_files, folder_path)
+            s3_objects = self._get_s3_objects(bucket_name, prefix)
+            return s3_objects, local_future.result()
     
     def _get_local_files(self, folder_path: str) -> Dict[str, Dict[str, Any]]:
         """
@@ -558,33 +791,113 @@ class S3SyncManager:
         """
         files = {}
         
-        for root, dirs, filenames in os.walk(folder_path):
-            # Пропускаем скрытые папки
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for filename in filenames:
-                # Пропускаем скрытые файлы
-                if filename.startswith('.'):
-                    continue
-                    
-                file_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(file_path, folder_path)
-                
-                try:
-                    stat = os.stat(file_path)
-                    files[rel_path] = {
-                        'size': stat.st_size,
-                        'mtime': stat.st_mtime,
-                        'is_dir': False
-                    }
-                except Exception as e:
-                    logger.error(f"Ошибка при получении информации о файле {file_path}: {e}")
+        for file_path, rel_path, stat in self._iter_local_files(folder_path):
+            files[rel_path] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'is_dir': False
+            }
         
         return files
     
+    def _iter_local_files(self, folder_path: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """
+        Обход локальной папки через os.scandir без повторного stat для каждого файла
+        
+        Скрытые файлы и папки пропускаются.
+        
+        Args:
+            folder_path (str): Путь к папке
+            
+        Yields:
+            Tuple[str, str, os.stat_result]: Полный путь, относительный путь и stat файла
+        """
+        # Стек папок для обхода: (полный путь, относительный путь с разделителем на конце)
+        stack = [(folder_path, '')]
+        
+        while stack:
+            dir_path, rel_dir = stack.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        # Пропускаем скрытые файлы и папки
+                        if entry.name.startswith('.'):
+                            continue
+                        
+                        rel_path = rel_dir + entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append((entry.path, rel_path + os.sep))
+                                continue
+                            elif not entry.is_file():
+                                # Ссылки на папки и специальные файлы не синхронизируются
+                                continue
+                            stat = entry.stat()
+                        except OSError as e:
+                            logger.error(f"Ошибка при получении информации о файле {entry.path}: {e}")
+                            continue
+                        
+                        yield entry.path, rel_path, stat
+            except OSError as e:
+                logger.error(f"Ошибка при чтении папки {dir_path}: {e}")
+    
+    def _load_state_index(self, config_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузка состояний файлов конфигурации одним запросом
+        
+        Args:
+            config_id (int): ID конфигурации
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Состояния файлов по относительному пути
+        """
+        return {state['file_path']: state for state in self.db_manager.get_file_states(config_id)}
+    
+    def _get_file_state(self, config_id: int, rel_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Получение сохраненного состояния файла
+        
+        Во время синхронизации и предпросмотра используется индекс из _load_state_index,
+        иначе выполняется запрос к базе данных.
+        
+        Args:
+            config_id (int): ID конфигурации
+            rel_path (str): Относительный путь к файлу
+            
+        Returns:
+            Optional[Dict[str, Any]]: Состояние файла или None
+        """
+        if self._state_index is not None:
+            return self._state_index.get(rel_path)
+        return self.db_manager.get_file_state(config_id, rel_path)
+    
+    def _matches_file_state(self, config_id: int, rel_path: str, 
+                            local_size: int, local_mtime: float) -> bool:
+        """
+        Проверка, совпадает ли локальный файл с сохраненным после синхронизации состоянием
+        
+        Args:
+            config_id (int): ID конфигурации в базе данных
+            rel_path (str): Относительный путь к файлу
+            local_size (int): Текущий размер файла
+            local_mtime (float): Текущее время модификации файла
+            
+        Returns:
+            bool: True, если размер и время модификации совпадают с базой данных
+        """
+        state = self._get_file_state(config_id, rel_path)
+        if not state or state.get('modified_time') is None:
+            return False
+        
+        # Для старых записей размер может быть не сохранен
+        if state.get('file_size') is not None and state['file_size'] != local_size:
+            return False
+        
+        return abs(state['modified_time'] - local_mtime) < 1  # Допускаем погрешность в 1 секунду
+    
     def _need_upload(self, local_file_path: str, remote_mtime: Optional[float], 
                     remote_size: Optional[int], remote_etag: Optional[str], 
-                    config_id: int, rel_path: str) -> bool:
+                    config_id: int, rel_path: str, local_stat: Optional[os.stat_result] = None) -> bool:
         """
         Проверка, нужно ли загружать/обновлять объект
         
@@ -595,13 +908,15 @@ class S3SyncManager:
             remote_etag (Optional[str]): ETag объекта в S3
             config_id (int): ID конфигурации в базе данных
             rel_path (str): Относительный путь к файлу
+            local_stat (Optional[os.stat_result]): Уже полученный stat файла (иначе выполняется os.stat)
             
         Returns:
             bool: True, если объект нужно загрузить/обновить
         """
         try:
             # Получаем информацию о локальном файле
-            local_stat = os.stat(local_file_path)
+            if local_stat is None:
+                local_stat = os.stat(local_file_path)
             local_size = local_stat.st_size
             local_mtime = local_stat.st_mtime
             
@@ -609,6 +924,13 @@ class S3SyncManager:
             if remote_mtime is None or remote_size is None or remote_etag is None:
                 return True
             
+            # Файл не менялся с прошлой синхронизации, а объект в S3 того же размера
+            # и загружен не раньше локального изменения - остальные проверки не нужны.
+            # Одного состояния в базе недостаточно: оно обновляется и после неудачной синхронизации
+            if (local_size == remote_size and remote_mtime >= local_mtime
+                    and self._matches_file_state(config_id, rel_path, local_size, local_mtime)):
+                return False
+            
             # Сравниваем размеры
             if local_size != remote_size:
                 return True
@@ -618,18 +940,16 @@ class S3SyncManager:
                 return True
             
             # Сравниваем ETag (хеш) объекта
-            local_etag = self.calculate_file_etag(local_file_path)
+            local_etag = self.calculate_file_etag(local_file_path, remote_etag)
             if local_etag != remote_etag:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            state = self._get_file_state(config_id, rel_path)
+            if state:
+                # Если время модификации в базе отличается от текущего, нужно обновить
+                if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
+                    return True
             
             return False
             
@@ -637,15 +957,19 @@ class S3SyncManager:
             logger.error(f"Ошибка при проверке необходимости загрузки файла {local_file_path}: {e}")
             return True  # В случае ошибки, считаем что объект нужно обновить
     
-    def _need_download(self, bucket_name: str, s3_key: str, local_file_path: str, 
-                      config_id: int, rel_path: str) -> bool:
+    def _need_download(self, local_file_path: str, remote_mtime: float, remote_size: int, 
+                      remote_etag: str, config_id: int, rel_path: str) -> bool:
         """
         Проверка, нужно ли скачивать/обновлять файл
         
+        Метаданные объекта берутся из листинга _get_s3_objects, отдельный
+        запрос head_object для каждого файла не выполняется.
+        
         Args:
-            bucket_name (str): Имя бакета S3
-            s3_key (str): Ключ объекта в S3
             local_file_path (str): Путь к локальному файлу
+            remote_mtime (float): Время модификации объекта в S3
+            remote_size (int): Размер объекта в S3
+            remote_etag (str): ETag объекта в S3
             config_id (int): ID конфигурации в базе данных
             rel_path (str): Относительный путь к файлу
             
@@ -658,14 +982,10 @@ class S3SyncManager:
             local_size = local_stat.st_size
             local_mtime = local_stat.st_mtime
             
-            # Получаем информацию об объекте в S3
-            try:
-                response = self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
-                remote_size = response['ContentLength']
-                remote_mtime = response['LastModified'].timestamp()
-                remote_etag = response['ETag'].strip('"')
-            except ClientError:
-                # Объект не найден в S3
+            # Файл не менялся с прошлой синхронизации, а объект в S3 того же размера
+            # и не новее локальной копии - остальные проверки не нужны
+            if (local_size == remote_size and remote_mtime <= local_mtime
+                    and self._matches_file_state(config_id, rel_path, local_size, local_mtime)):
                 return False
             
             # Сравниваем размеры
@@ -677,18 +997,16 @@ class S3SyncManager:
                 return True
             
             # Сравниваем ETag (хеш) объекта
-            local_etag = self.calculate_file_etag(local_file_path)
+            local_etag = self.calculate_file_etag(local_file_path, remote_etag)
             if local_etag != remote_etag:
                 return True
             
             # Проверяем состояние файла в базе данных
-            file_states = self.db_manager.get_file_states(config_id)
-            for state in file_states:
-                if state['file_path'] == rel_path:
-                    # Если время модификации в базе отличается от текущего, нужно обновить
-                    if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
-                        return True
-                    break
+            state = self._get_file_state(config_id, rel_path)
+            if state:
+                # Если время модификации в базе отличается от текущего, нужно обновить
+                if abs(state['modified_time'] - local_mtime) > 1:  # Допускаем погрешность в 1 секунду
+                    return True
             
             return False
             
@@ -696,39 +1014,96 @@ class S3SyncManager:
             logger.error(f"Ошибка при проверке необходимости скачивания файла {local_file_path}: {e}")
             return True  # В случае ошибки, считаем что файл нужно обновить
     
-    def calculate_file_etag(self, file_path: str, chunk_size: int = 8 * 1024 * 1024) -> Optional[str]:
+    def calculate_file_etag(self, file_path: str, remote_etag: Optional[str] = None) -> Optional[str]:
         """
         Вычисление ETag файла для сравнения с объектом в S3
         
+        Если передан ETag объекта, ETag файла вычисляется в той же форме: MD5 содержимого
+        для обычного объекта и составной ETag с размером части, восстановленным по
+        количеству частей, для составного. Без него повторяются правила менеджера
+        передач: файлы меньше S3_MULTIPART_THRESHOLD получают ETag-MD5, остальные -
+        составной ETag по частям S3_MULTIPART_CHUNKSIZE.
+        
         Args:
             file_path (str): Путь к файлу
-            chunk_size (int): Размер чанка для вычисления MD5
+            remote_etag (Optional[str]): ETag объекта в S3 (без кавычек)
             
         Returns:
             Optional[str]: ETag файла или None в случае ошибки
         """
-        md5s = []
-        
         try:
             with open(file_path, 'rb') as f:
-                while True:
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-                    md5s.append(hashlib.md5(data).digest())
-            
-            if len(md5s) == 1:
-                # Для одного чанка ETag - это просто MD5
-                return hashlib.md5(md5s[0]).hexdigest()
-            else:
-                # Для нескольких чанков ETag вычисляется как MD5 от конкатенации MD5 каждого чанка
-                digests = b''.join(md5s)
-                return '{}-{}'.format(hashlib.md5(digests).hexdigest(), len(md5s))
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size == 0:
+                    # Пустой файл нельзя отобразить в память
+                    return hashlib.md5().hexdigest()
+                
+                chunk_size = self._etag_part_size(file_size, remote_etag)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if chunk_size is None:
+                        # Объект загружен одним запросом, его ETag - MD5 содержимого
+                        return hashlib.md5(mm).hexdigest()
+                    
+                    # Части хешируются параллельно: hashlib освобождает GIL, поэтому чтение
+                    # страниц с диска и вычисление MD5 разных частей перекрываются.
+                    # Срезы memoryview не копируют данные отображения, map сохраняет порядок частей
+                    offsets = range(0, file_size, chunk_size)
+                    with memoryview(mm) as view, \
+                            ThreadPoolExecutor(max_workers=min(S3_ETAG_WORKERS, len(offsets))) as executor:
+                        md5s = list(executor.map(
+                            lambda offset: hashlib.md5(view[offset:offset + chunk_size]).digest(), offsets))
+            
+            # Для нескольких чанков ETag вычисляется как MD5 от конкатенации MD5 каждого чанка
+            digests = b''.join(md5s)
+            return '{}-{}'.format(hashlib.md5(digests).hexdigest(), len(md5s))
                 
         except Exception as e:
             logger.error(f"Ошибка при вычислении ETag файла {file_path}: {e}")
             return None
     
+    @staticmethod
+    def _etag_part_size(file_size: int, remote_etag: Optional[str] = None) -> Optional[int]:
+        """
+        Определение размера части для вычисления составного ETag
+        
+        Args:
+            file_size (int): Размер файла
+            remote_etag (Optional[str]): ETag объекта в S3 (без кавычек)
+            
+        Returns:
+            Optional[int]: Размер части или None, если ETag - MD5 всего содержимого
+        """
+        if remote_etag is None:
+            return S3_MULTIPART_CHUNKSIZE if file_size >= S3_MULTIPART_THRESHOLD else None
+        
+        if '-' not in remote_etag:
+            return None
+        
+        try:
+            part_count = int(remote_etag.rsplit('-', 1)[1])
+        except ValueError:
+            return S3_MULTIPART_CHUNKSIZE
+        if part_count < 1:
+            return S3_MULTIPART_CHUNKSIZE
+        
+        # Все части, кроме последней, одного размера, и количеству частей соответствует
+        # целый диапазон размеров. Проверяем по порядку размер по умолчанию, ближайший
+        # размер вида 8 МБ * 2^k (значения по умолчанию boto3/AWS CLI и их удвоения),
+        # минимальный размер, округленный до мегабайта, и минимальный размер без округления
+        mib = 1024 * 1024
+        min_part_size = -(-file_size // part_count)
+        power_part_size = 8 * mib
+        while power_part_size < min_part_size:
+            power_part_size *= 2
+        
+        for part_size in (S3_MULTIPART_CHUNKSIZE, power_part_size,
+                          -(-min_part_size // mib) * mib, min_part_size):
+            if -(-file_size // part_size) == part_count:
+                return part_size
+        
+        # Файл не может быть разбит на столько частей - ETag все равно не совпадет
+        return S3_MULTIPART_CHUNKSIZE
+    
     def _upload_file(self, local_file_path: str, bucket_name: str, s3_key: str, 
                     callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
@@ -756,7 +1131,8 @@ class S3SyncManager:
                 local_file_path, 
                 bucket_name, 
                 s3_key,
-                ExtraArgs=extra_args
+                ExtraArgs=extra_args,
+                Config=self._transfer_config
             )
             
             info_msg = f"Загружен файл в S3: {os.path.basename(local_file_path)}"
@@ -772,7 +1148,7 @@ class S3SyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
     def _download_file(self, bucket_name: str, s3_key: str, local_file_path: str, 
@@ -793,10 +1169,10 @@ class S3SyncManager:
             # Создаем директорию для сохранения файла, если она не существует
             output_dir = os.path.dirname(local_file_path)
             if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+                os.makedirs(output_dir, exist_ok=True)
             
             # Скачиваем файл
-            self.s3_client.download_file(bucket_name, s3_key, local_file_path)
+            self.s3_client.download_file(bucket_name, s3_key, local_file_path, Config=self._transfer_config)
             
             info_msg = f"Скачан файл из S3: {os.path.basename(s3_key)}"
             logger.info(info_msg)
@@ -811,7 +1187,7 @@ class S3SyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
     def _delete_object(self, bucket_name: str, s3_key: str, 
@@ -844,9 +1220,64 @@ class S3SyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
+    def _delete_objects(self, bucket_name: str, s3_keys: List[str], 
+                       callback: Optional[Callable[[str, str], None]] = None) -> Set[str]:
+        """
+        Удаление набора объектов из S3 одним запросом delete_objects
+        
+        Args:
+            bucket_name (str): Имя бакета
+            s3_keys (List[str]): Ключи объектов (не более S3_DELETE_BATCH_SIZE)
+            callback (Optional[Callable[[str, str], None]]): Функция обратного вызова для обновления прогресса
+            
+        Returns:
+            Set[str]: Ключи успешно удаленных объектов
+        """
+        if not s3_keys:
+            return set()
+        
+        try:
+            # В режиме Quiet ответ содержит только ошибки
+            response = self.s3_client.delete_objects(
+                Bucket=bucket_name,
+                Delete={'Objects': [{'Key': s3_key} for s3_key in s3_keys], 'Quiet': True}
+            )
+        except ClientError as e:
+            error_msg = f"Ошибка при удалении {len(s3_keys)} объектов из S3: {e}"
+            logger.error(error_msg)
+            if callback:
+                callback(error_msg, "error")
+            
+            self._increment_stat('errors')
+            return set()
+        
+        failed_keys = set()
+        for error in response.get('Errors', []):
+            failed_keys.add(error.get('Key'))
+            error_msg = f"Ошибка при удалении объекта {error.get('Key')} из S3: " \
+                        f"{error.get('Code')} {error.get('Message', '')}"
+            logger.error(error_msg)
+            if callback:
+                callback(error_msg, "error")
+            
+            self._increment_stat('errors')
+        
+        deleted_keys = set()
+        for s3_key in s3_keys:
+            if s3_key in failed_keys:
+                continue
+            deleted_keys.add(s3_key)
+            
+            info_msg = f"Удален объект из S3: {os.path.basename(s3_key)}"
+            logger.info(info_msg)
+            if callback:
+                callback(info_msg, "info")
+        
+        return deleted_keys
+    
     def _delete_local_file(self, file_path: str, callback: Optional[Callable[[str, str], None]] = None) -> bool:
         """
         Удаление локального файла
@@ -879,7 +1310,7 @@ class S3SyncManager:
             if callback:
                 callback(error_msg, "error")
             
-            self.sync_stats['errors'] += 1
+            self._increment_stat('errors')
             return False
     
     def _get_content_type(self, file_path: str) -> Optional[str]:
@@ -919,11 +1350,87 @@ class S3SyncManager:
                 file_path=rel_path,
                 file_hash=None,  # Для S3 не используем хеш
                 modified_time=file_stat.st_mtime,
-                sync_status=sync_status
+                sync_status=sync_status,
+                file_size=file_stat.st_size
             )
         except Exception as e:
             logger.error(f"Ошибка при обновлении состояния файла в базе данных: {e}")
     
+    def _queue_file_state(self, config_id: int, rel_path: str, file_path: str, sync_status: str,
+                          file_stat: Optional[os.stat_result] = None):
+        """
+        Добавление состояния файла в очередь записи в базу данных
+        
+        Вызывается из рабочих потоков; при накоплении S3_DB_BATCH_SIZE записей
+        они записываются одной транзакцией.
+        
+        Args:
+            config_id (int): ID конфигурации
+            rel_path (str): Относительный путь к файлу
+            file_path (str): Полный путь к файлу
+            sync_status (str): Статус синхронизации
+            file_stat (Optional[os.stat_result]): Уже полученный stat файла (иначе выполняется os.stat)
+        """
+        if file_stat is None:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError as e:
+                logger.error(f"Ошибка при обновлении состояния файла в базе данных: {e}")
+                return
+        
+        with self._stats_lock:
+            self._pending_states.append((rel_path, None, file_stat.st_mtime, sync_status, file_stat.st_size))
+            if len(self._pending_states) < S3_DB_BATCH_SIZE:
+                return
+            rows, self._pending_states = self._pending_states, []
+        
+        self._write_file_states(config_id, rows)
+    
+    def _flush_file_states(self, config_id: int):
+        """
+        Запись накопленных состояний файлов в базу данных
+        
+        Args:
+            config_id (int): ID конфигурации
+        """
+        with self._stats_lock:
+            rows, self._pending_states = self._pending_states, []
+        
+        self._write_file_states(config_id, rows)
+    
+    def _write_file_states(self, config_id: int, rows: List[Tuple[Any, ...]]):
+        """
+        Запись состояний набора файлов в базу данных одной транзакцией
+        
+        Args:
+            config_id (int): ID конфигурации
+            rows (List[Tuple[Any, ...]]): Строки для bulk_update_file_states
+        """
+        if not rows:
+            return
+        
+        try:
+            self.db_manager.bulk_update_file_states(config_id, rows)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении состояний файлов в базе данных: {e}")
+    
+    def _delete_file_states(self, config_id: int, rel_paths: List[str]):
+        """
+        Удаление состояний набора файлов из базы данных одной транзакцией
+        
+        Args:
+            config_id (int): ID конфигурации
+            rel_paths (List[str]): Относительные пути файлов; список очищается
+        """
+        if not rel_paths:
+            return
+        
+        try:
+            self.db_manager.delete_file_states(config_id, rel_paths)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении состояний файлов из базы данных: {e}")
+        rel_paths.clear()
+    
     def update_file_states(self, config_id: int, source_path: str, target_info: Dict[str, str], direction: str = 'upload'):
         """
         Обновление состояний файлов в базе данных
@@ -936,7 +1443,7 @@ class S3SyncManager:
         """
         try:
             bucket_name = target_info.get('bucket_name', '')
-            prefix = target_info.get('prefix', '')
+            prefix = self._normalize_prefix(target_info.get('prefix', ''))
             
             if direction == 'upload':
                 # Обновляем состояния на основе локальных файлов
@@ -945,51 +1452,36 @@ class S3SyncManager:
                         local_file_path = os.path.join(root, filename)
                         rel_path = os.path.relpath(local_file_path, source_path)
                         
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+                        self._queue_file_state(config_id, rel_path, local_file_path, 'synced')
+                self._flush_file_states(config_id)
                 
                 # Удаляем из базы данных записи о файлах, которых больше нет локально
                 file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    local_file_path = os.path.join(source_path, state['file_path'])
-                    if not os.path.exists(local_file_path):
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+                self._delete_file_states(config_id, [
+                    state['file_path'] for state in file_states
+                    if not os.path.exists(os.path.join(source_path, state['file_path']))
+                ])
             
             elif direction == 'download':
                 # Обновляем состояния на основе файлов в S3
                 s3_objects = self._get_s3_objects(bucket_name, prefix)
                 
-                for obj in s3_objects:
-                    s3_key = obj['key']
-                    
-                    # Пропускаем объекты, которые не соответствуют префиксу
-                    if prefix and not s3_key.startswith(prefix):
-                        continue
-                    
-                    # Определяем относительный путь
-                    if prefix:
-                        rel_path = s3_key[len(prefix):].lstrip('/')
-                    else:
-                        rel_path = s3_key
+                for s3_key in s3_objects:
+                    # Листинг ограничен префиксом, относительный путь - остаток ключа
+                    rel_path = s3_key[len(prefix):]
                     
                     local_file_path = os.path.join(source_path, rel_path)
                     
                     if os.path.exists(local_file_path):
-                        self._update_file_state_in_db(config_id, rel_path, local_file_path, 'synced')
+                        self._queue_file_state(config_id, rel_path, local_file_path, 'synced')
+                self._flush_file_states(config_id)
                 
                 # Удаляем из базы данных записи о файлах, которых больше нет в S3
                 file_states = self.db_manager.get_file_states(config_id)
-                for state in file_states:
-                    s3_key = os.path.join(prefix, state['file_path']).replace("\\", "/")
-                    
-                    # Проверяем, существует ли объект в S3
-                    object_exists = False
-                    for obj in s3_objects:
-                        if obj['key'] == s3_key:
-                            object_exists = True
-                            break
-                    
-                    if not object_exists:
-                        self.db_manager.delete_file_state(config_id, state['file_path'])
+                self._delete_file_states(config_id, [
+                    state['file_path'] for state in file_states
+                    if prefix + state['file_path'].replace(os.sep, '/') not in s3_objects
+                ])
             
             logger.info(f"Обновлены состояния файлов для конфигурации {config_id}")
             
@@ -1037,9 +1529,12 @@ class S3SyncManager:
             'errors': []
         }
         
+        previous_state_index = self._state_index
+        self._state_index = self._load_state_index(config_id)
+        
         try:
             bucket_name = target_info.get('bucket_name', '')
-            prefix = target_info.get('prefix', '')
+            prefix = self._normalize_prefix(target_info.get('prefix', ''))
             
             if direction == 'upload':
                 # Предпросмотр загрузки в S3
@@ -1048,23 +1543,21 @@ class S3SyncManager:
                     return preview
                 
                 # Получаем списки файлов
-                local_files = self._get_local_files(source_path)
-                s3_objects = self._get_s3_objects(bucket_name, prefix)
+                s3_objects, local_files = self._get_listings(bucket_name, prefix, source_path)
                 
                 # Файлы для загрузки
                 for rel_path, file_info in local_files.items():
                     # Ищем файл в S3
-                    s3_key = os.path.join(prefix, rel_path).replace("\\", "/")
+                    s3_key = prefix + rel_path.replace(os.sep, '/')
                     remote_mtime = None
                     remote_size = None
                     remote_etag = None
                     
-                    for obj in s3_objects:
-                        if obj['key'] == s3_key:
-                            remote_mtime = obj['last_modified'].timestamp()
-                            remote_size = obj['size']
-                            remote_etag = obj['etag'].strip('"')
-                            break
+                    obj = s3_objects.get(s3_key)
+                    if obj is not None:
+                        remote_mtime = obj['mtime']
+                        remote_size = obj['size']
+                        remote_etag = obj['etag']
                     
                     if remote_mtime is None or remote_size is None or remote_etag is None:
                         # Файла нет в S3, загружаем
@@ -1089,18 +1582,9 @@ class S3SyncManager:
                             })
                 
                 # Файлы для удаления
-                for obj in s3_objects:
-                    s3_key = obj['key']
-                    
-                    # Пропускаем объекты, которые не соответствуют префиксу
-                    if prefix and not s3_key.startswith(prefix):
-                        continue
-                    
-                    # Определяем относительный путь
-                    if prefix:
-                        rel_path = s3_key[len(prefix):].lstrip('/')
-                    else:
-                        rel_path = s3_key
+                for s3_key, obj in s3_objects.items():
+                    # Листинг ограничен префиксом, относительный путь - остаток ключа
+                    rel_path = s3_key[len(prefix):]
                     
                     local_file_path = os.path.join(source_path, rel_path.replace("/", os.sep))
                     
@@ -1108,44 +1592,35 @@ class S3SyncManager:
                         preview['to_delete'].append({
                             'path': rel_path,
                             'size': obj['size'],
-                            'mtime': obj['last_modified'].timestamp()
+                            'mtime': obj['mtime']
                         })
             
             elif direction == 'download':
                 # Предпросмотр скачивания из S3
                 # Получаем списки файлов
-                local_files = self._get_local_files(source_path) if os.path.exists(source_path) else {}
-                s3_objects = self._get_s3_objects(bucket_name, prefix)
+                s3_objects, local_files = self._get_listings(bucket_name, prefix, source_path)
                 
                 # Файлы для скачивания
-                for obj in s3_objects:
-                    s3_key = obj['key']
-                    
-                    # Пропускаем объекты, которые не соответствуют префиксу
-                    if prefix and not s3_key.startswith(prefix):
-                        continue
-                    
-                    # Определяем относительный путь
-                    if prefix:
-                        rel_path = s3_key[len(prefix):].lstrip('/')
-                    else:
-                        rel_path = s3_key
+                for s3_key, obj in s3_objects.items():
+                    # Листинг ограничен префиксом, относительный путь - остаток ключа
+                    rel_path = s3_key[len(prefix):]
                     
                     if rel_path not in local_files:
                         # Файла нет локально, скачиваем
                         preview['to_download'].append({
                             'path': rel_path,
                             'size': obj['size'],
-                            'mtime': obj['last_modified'].timestamp()
+                            'mtime': obj['mtime']
                         })
                     else:
                         # Файл есть локально, проверяем, нужно ли обновлять
                         local_file_path = os.path.join(source_path, rel_path)
-                        if self._need_download(bucket_name, s3_key, local_file_path, config_id, rel_path):
+                        if self._need_download(local_file_path, obj['mtime'], obj['size'], obj['etag'],
+                                               config_id, rel_path):
                             preview['to_download'].append({
                                 'path': rel_path,
                                 'size': obj['size'],
-                                'mtime': obj['last_modified'].timestamp()
+                                'mtime': obj['mtime']
                             })
                         else:
                             preview['to_skip'].append({
@@ -1156,16 +1631,10 @@ class S3SyncManager:
                 
                 # Файлы для удаления
                 for rel_path in local_files:
-                    s3_key = os.path.join(prefix, rel_path).replace("\\", "/")
+                    s3_key = prefix + rel_path.replace(os.sep, '/')
                     
                     # Проверяем, существует ли объект в S3
-                    object_exists = False
-                    for obj in s3_objects:
-                        if obj['key'] == s3_key:
-                            object_exists = True
-                            break
-                    
-                    if not object_exists:
+                    if s3_key not in s3_objects:
                         preview['to_delete'].append({
                             'path': rel_path,
                             'size': local_files[rel_path]['size'],
@@ -1177,5 +1646,8 @@ class S3SyncManager:
         except Exception as e:
             preview['errors'].append(f"Ошибка при предварительном просмотре синхронизации: {e}")
             return preview
+        
+        finally:
+            self._state_index = previous_state_index
 
 S3Sync = S3SyncManager
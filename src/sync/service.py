@@ -94,6 +94,7 @@ class SyncService:
                     callback=lambda msg, *_: emit(msg),
                     delete_mode=delete_mode,
                     history_id=history_id,
+                    strict_hash=bool(config.get('verify_integrity', False)),
                 )
                 success = result.get('errors', 0) == 0
                 self.sync_managers['local'].update_file_states(config_id, source_path)
@@ -200,7 +201,7 @@ class SyncService:
                 storage_class = target_settings.get('storage_class', 'STANDARD')
                 sse = bool(target_settings.get('sse', False))
 
-                if manager.connect(access_key, secret_key, endpoint, region, use_https):
+                if manager.connect(access_key, secret_key, endpoint, region, use_https, bucket_name=bucket):
                     target_info = {
                         'bucket_name': bucket,
                         'prefix': prefix,
@@ -402,7 +403,7 @@ class SyncService:
             return {'success': False, 'message': 'Не указан bucket'}
 
         manager = self.sync_managers['s3']
-        if manager.connect(access_key, secret_key, endpoint, region):
+        if manager.connect(access_key, secret_key, endpoint, region, bucket_name=bucket):
             try:
                 # Try to list bucket
                 manager.s3_client.head_bucket(Bucket=bucket)
@@ -33,7 +33,7 @@ from contextlib import contextmanager
 from src.core.constants import (
     APP_NAME, APP_VERSION, APP_AUTHOR, APP_WEBSITE,
     MAX_FILENAME_LENGTH, MAX_PATH_LENGTH,
-    DEFAULT_FILE_BUFFER_SIZE,
+    DEFAULT_FILE_BUFFER_SIZE, DEFAULT_SAMPLE_WINDOW,
     LOG_LEVEL_DEBUG, LOG_LEVEL_INFO, LOG_LEVEL_WARNING, LOG_LEVEL_ERROR, LOG_LEVEL_CRITICAL
 )
 
@@ -75,9 +75,45 @@ class FileUtils:
         """
         try:
             hash_func = getattr(hashlib, algorithm)()
-            with open(file_path, "rb") as f:
-                while chunk := f.read(buffer_size):
-                    hash_func.update(chunk)
+            # Чтение в один переиспользуемый буфер без промежуточных копий (как hashlib.file_digest)
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            with open(file_path, "rb", buffering=0) as f:
+                while size := f.readinto(buffer):
+                    hash_func.update(view[:size])
+            return hash_func.hexdigest()
+        except Exception as e:
+            logger.error(f"Ошибка при получении хеша файла {file_path}: {e}")
+            return ""
+    
+    @staticmethod
+    def get_sample_hash(file_path: str, window: int = DEFAULT_SAMPLE_WINDOW, algorithm: str = "sha256") -> str:
+        """
+        Получение хеша по выборке из начала, середины и конца файла
+        
+        Читается не более трех окон по window байт независимо от размера файла.
+        Подходит для обнаружения изменений, но не для проверки целостности.
+        
+        Args:
+            file_path (str): Путь к файлу
+            window (int): Размер окна выборки
+            algorithm (str): Алгоритм хеширования (md5, sha1, sha256, sha512)
+            
+        Returns:
+            str: Хеш выборки
+        """
+        try:
+            hash_func = getattr(hashlib, algorithm)()
+            with open(file_path, "rb", buffering=0) as f:
+                size = os.fstat(f.fileno()).st_size
+                if size <= 3 * window:
+                    offsets = [0]
+                    window = size
+                else:
+                    offsets = [0, size // 2, size - window]
+                for offset in offsets:
+                    f.seek(offset)
+                    hash_func.update(f.read(window))
             return hash_func.hexdigest()
         except Exception as e:
             logger.error(f"Ошибка при получении хеша файла {file_path}: {e}")